@@ -1,31 +1,320 @@
+import io
 import os
+import re
+import sys
+import json
+import math
+import time
+import hashlib
+import sqlite3
 import argparse
-from PIL import Image
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from PIL import Image, ImageMath, ImageSequence, TiffImagePlugin
+except ImportError:
+    print("Error: Pillow library is not installed.")
+    print("Please install it using: pip install Pillow")
+    sys.exit(1)
 
 # Supported image formats for Pillow
-SUPPORTED_FORMATS = ['.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tiff']
+SUPPORTED_FORMATS = ['.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tiff', '.tif', '.gif']
+
+# Images handed to a worker process per task with --jobs
+CHUNK_SIZE = 16
+
+# Suffix added to output names; files carrying it are never used as inputs
+OUTPUT_SUFFIX = "_compressed"
+
+# Sidecar database in the processed directory that enables incremental runs
+MANIFEST_NAME = ".compressor-manifest.sqlite"
+
+# Quality range searched by --target-size and --min-ssim
+MIN_QUALITY = 10
+MAX_QUALITY = 95
+
+# --min-ssim compares a mosaic of native-resolution tiles no larger than this
+PREVIEW_SIZE = 512
+
+# SSIM stabilising constants for 8-bit luma
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+# String-expression ImageMath: eval until Pillow 10.3 renamed it unsafe_eval
+# (eval was removed in 12). The expressions below are constants.
+IMAGE_MATH = getattr(ImageMath, "unsafe_eval", None) or ImageMath.eval
+
+# Bytes per pixel of a decoded image by mode; Pillow pads 3-band modes to 4
+MODE_BYTES = {"1": 1, "L": 1, "P": 1, "I;16": 2, "I;16B": 2, "LA": 4, "RGB": 4, "RGBA": 4, "CMYK": 4, "YCbCr": 4,
+              "I": 4, "F": 4}
+
+# Extra bytes per pixel libjpeg needs for optimize=True (two-pass Huffman)
+JPEG_OPTIMIZE_BYTES = 3
+
+# GIF frames after the first decode to RGB(A), and the writer keeps a copy of each
+GIF_FRAME_BYTES = 8
+
+Result = namedtuple("Result", "path original_size new_size error output digest quality peak_rss note")
+
+class MemoryBudgetError(Exception):
+    pass
+
+def reset_peak_rss():
+    """Reset the kernel's peak-RSS counter for this process (Linux); False if unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss():
+    """Peak resident memory of this process in bytes, or None if unknown."""
+    try:
+        with open("/proc/self/status") as f:
+            return int(re.search(r"VmHWM:\s+(\d+) kB", f.read()).group(1)) * 1024
+    except (OSError, AttributeError):
+        return None
+
+def plan_decode(img, budget, oversize, max_dimension=None):
+    """Fit decoding img into budget bytes; returns a note on what was changed, or None.
+
+    JPEGs over the budget are decoded at 1/2, 1/4 or 1/8 scale through
+    draft(). Other formats cannot be decoded smaller, so they are refused,
+    as is everything over the budget when oversize is "refuse". GIF frames
+    are all held while saving, so they count together.
+    """
+    if img.format == "GIF":
+        needed = img.width * img.height * GIF_FRAME_BYTES * getattr(img, "n_frames", 1)
+    else:
+        needed = img.width * img.height * MODE_BYTES.get(img.mode, 4)
+    if needed <= budget:
+        return None
+    message = f"needs ~{needed / 1024 / 1024:.0f}MB to decode, budget is {budget / 1024 / 1024:.0f}MB"
+    if oversize == "refuse" or img.format != "JPEG":
+        raise MemoryBudgetError(message)
+    for scale in (2, 4, 8):
+        if needed / scale ** 2 <= budget:
+            size = (math.ceil(img.width / scale), math.ceil(img.height / scale))
+            if max_dimension:
+                size = (min(size[0], max_dimension), min(size[1], max_dimension))
+            width = img.width
+            img.draft(img.mode, size)
+            return f"decoded at 1/{width // img.width} scale: {message}"
+    raise MemoryBudgetError(message)
+
+def save_tiff_frames(img, output_path, max_dimension=None):
+    """Write every frame of a TIFF one at a time, so only one is in memory."""
+    with open(output_path, "w+b") as fp, TiffImagePlugin.AppendingTiffWriter(fp) as tf:
+        for frame in ImageSequence.Iterator(img):
+            if max_dimension:
+                frame = frame.copy()
+                frame.thumbnail((max_dimension, max_dimension))
+            frame.save(tf, "TIFF", compression="tiff_adobe_deflate")
+            tf.newFrame()
+
+def is_output(file_path):
+    return os.path.splitext(os.path.basename(file_path))[0].endswith(OUTPUT_SUFFIX)
+
+def file_digest(file_path):
+    """BLAKE2b of a file's bytes, read in 1 MiB blocks."""
+    digest = hashlib.blake2b()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class Manifest:
+    """Records what was compressed, from which source and with which settings.
+
+    Rows are keyed by the source path relative to the manifest's directory.
+    A source is current when its row has the same settings, its output still
+    exists, and either its size and mtime are unchanged or (if only the
+    mtime moved) its content hash still matches.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.db = sqlite3.connect(os.path.join(directory, MANIFEST_NAME))
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, digest TEXT,
+                settings TEXT, output TEXT, output_size INTEGER)""")
+        self.rows = {row[0]: row[1:] for row in self.db.execute("SELECT * FROM images")}
+        self.outputs = {os.path.join(directory, row[4]) for row in self.rows.values()}
+        self.pending = []
+
+    def is_current(self, file_path, settings):
+        rel = os.path.relpath(file_path, self.directory)
+        row = self.rows.get(rel)
+        if row is None:
+            return False
+        size, mtime_ns, digest, row_settings, output, _ = row
+        if row_settings != settings or not os.path.exists(os.path.join(self.directory, output)):
+            return False
+        st = os.stat(file_path)
+        if (st.st_size, st.st_mtime_ns) == (size, mtime_ns):
+            return True
+        if st.st_size != size or file_digest(file_path) != digest:
+            return False
+        self.pending.append((rel, st.st_size, st.st_mtime_ns) + row[2:])
+        return True
+
+    def record(self, result, settings):
+        st = os.stat(result.path)
+        self.pending.append((os.path.relpath(result.path, self.directory), st.st_size, st.st_mtime_ns,
+                             result.digest, settings, os.path.relpath(result.output, self.directory),
+                             result.new_size))
+        if len(self.pending) >= 1000:
+            self.flush()
+
+    def flush(self):
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?)", self.pending)
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+def encode(img, fmt, quality, optimize=True):
+    """Encode img as JPEG or WEBP into memory."""
+    buffer = io.BytesIO()
+    if fmt == "JPEG":
+        img.save(buffer, "JPEG", quality=quality, optimize=optimize)
+    else:
+        img.save(buffer, "WEBP", quality=quality)
+    return buffer.getvalue()
+
+def ssim(a, b):
+    """Mean SSIM of two equally sized images, on luma over 8x8 blocks.
+
+    Block means and (co)variances come from Image.reduce() on float images,
+    so no pixel loop runs in Python.
+    """
+    x, y = a.convert("L").convert("F"), b.convert("L").convert("F")
+    mx, my = x.reduce(8), y.reduce(8)
+    xx = IMAGE_MATH("p * q", p=x, q=x).reduce(8)
+    yy = IMAGE_MATH("p * q", p=y, q=y).reduce(8)
+    xy = IMAGE_MATH("p * q", p=x, q=y).reduce(8)
+    blocks = IMAGE_MATH(
+        "((2 * mx * my + c1) * (2 * (xy - mx * my) + c2)) /"
+        " ((mx * mx + my * my + c1) * (xx - mx * mx + yy - my * my + c2))",
+        mx=mx, my=my, xx=xx, yy=yy, xy=xy, c1=SSIM_C1, c2=SSIM_C2)
+    return blocks.resize((1, 1), Image.Resampling.BOX).getpixel((0, 0))
 
-def compress_image(file_path, quality=60):
-    """Compresses a single image file."""
+def sample_tiles(img, size=PREVIEW_SIZE):
+    """A size x size mosaic of four tiles cut from img at its own resolution.
+
+    Compression artifacts are judged at the scale they will be seen, which a
+    downscaled preview would hide; tiles are 16-pixel aligned so JPEG blocks
+    line up with the source.
+    """
+    img = img.convert("RGB")
+    if img.width <= size and img.height <= size:
+        return img
+    tile = size // 2
+    mosaic = Image.new("RGB", (size, size))
+    for i, (fx, fy) in enumerate([(1, 1), (3, 1), (1, 3), (3, 3)]):
+        left = max(0, min(img.width - tile, img.width * fx // 4 - tile // 2)) // 16 * 16
+        top = max(0, min(img.height - tile, img.height * fy // 4 - tile // 2)) // 16 * 16
+        mosaic.paste(img.crop((left, top, left + tile, top + tile)), (i % 2 * tile, i // 2 * tile))
+    return mosaic
+
+def quality_for_size(img, fmt, target_size, optimize=True):
+    """Highest quality whose encoding fits in target_size bytes (MIN_QUALITY if none does)."""
+    lo, hi = MIN_QUALITY, MAX_QUALITY
+    best = None
+    while lo <= hi:
+        quality = (lo + hi) // 2
+        data = encode(img, fmt, quality, optimize)
+        if len(data) <= target_size:
+            best = (quality, data)
+            lo = quality + 1
+        else:
+            hi = quality - 1
+    return best or (MIN_QUALITY, encode(img, fmt, MIN_QUALITY, optimize))
+
+def quality_for_ssim(img, fmt, min_ssim):
+    """Lowest quality whose encoding of sample tiles keeps SSIM >= min_ssim."""
+    preview = sample_tiles(img)
+    lo, hi = MIN_QUALITY, MAX_QUALITY
+    while lo < hi:
+        quality = (lo + hi) // 2
+        with Image.open(io.BytesIO(encode(preview, fmt, quality))) as decoded:
+            score = ssim(preview, decoded)
+        if score >= min_ssim:
+            hi = quality
+        else:
+            lo = quality + 1
+    return lo
+
+def compress_image(file_path, quality=60, digest=False, target_size=None, min_ssim=None, max_dimension=None,
+                   memory_budget=None, oversize="downscale"):
+    """Compresses a single image file and returns a Result (None if the format is not supported).
+
+    For JPEG and WEBP, target_size picks the highest quality that fits in that
+    many bytes and min_ssim the lowest quality that keeps that similarity;
+    both search in memory. max_dimension shrinks the longest side first.
+    memory_budget (bytes) caps decoding as described in plan_decode().
+    With digest, the Result also carries the source's content hash for the manifest.
+    """
+    reset_peak_rss()
+    note = None
+    if memory_budget:
+        # The budget check below replaces Pillow's decompression bomb limit
+        Image.MAX_IMAGE_PIXELS = None
     try:
         with Image.open(file_path) as img:
             # Check if it's actually an image we want to process
             ext = os.path.splitext(file_path)[1].lower()
             if ext not in SUPPORTED_FORMATS:
-                return
+                return None
+
+            multi_frame = getattr(img, "n_frames", 1) > 1
+            optimize = True
+            if memory_budget:
+                note = plan_decode(img, memory_budget, oversize, max_dimension)
+                if img.format == "JPEG" and (img.width * img.height * (MODE_BYTES.get(img.mode, 4) + JPEG_OPTIMIZE_BYTES)
+                                             > memory_budget):
+                    optimize = False
+                    note = "; ".join(filter(None, [note, "saved without optimize to stay in budget"]))
+
+            if max_dimension and not multi_frame:
+                # JPEG can decode straight to a smaller scale; the rest is resampled
+                img.draft(img.mode, (max_dimension, max_dimension))
+                img.thumbnail((max_dimension, max_dimension))
 
             original_size = os.path.getsize(file_path)
-            
+
             # Construct new filename
             filename = os.path.basename(file_path)
             name, ext = os.path.splitext(filename)
-            new_filename = f"{name}_compressed{ext}"
+            new_filename = f"{name}{OUTPUT_SUFFIX}{ext}"
             output_path = os.path.join(os.path.dirname(file_path), new_filename)
 
             # Save with reduced quality
             # Optimize flag helps for PNGs and JPEGs
-            if ext in ['.jpg', '.jpeg']:
-                img.save(output_path, "JPEG", quality=quality, optimize=True)
+            fmt = {'.jpg': "JPEG", '.jpeg': "JPEG", '.webp': "WEBP"}.get(ext.lower())
+            chosen = None
+            if fmt and (target_size or min_ssim):
+                if target_size:
+                    chosen, data = quality_for_size(img, fmt, target_size, optimize)
+                else:
+                    chosen = quality_for_ssim(img, fmt, min_ssim)
+                    data = encode(img, fmt, chosen, optimize)
+                with open(output_path, 'wb') as f:
+                    f.write(data)
+            elif img.format == "TIFF" and multi_frame:
+                save_tiff_frames(img, output_path, max_dimension)
+            elif img.format == "GIF" and multi_frame:
+                img.save(output_path, "GIF", save_all=True, optimize=True)
+            elif ext.lower() in ['.tif', '.tiff']:
+                img.save(output_path, "TIFF", compression="tiff_adobe_deflate")
+            elif ext in ['.jpg', '.jpeg']:
+                img.save(output_path, "JPEG", quality=quality, optimize=optimize)
             elif ext == '.png':
                 # PNG quality is different, usually uses 'optimize=True' and P_QUANTIZE
                 # For simplicity in this script, we'll try to optimize.
@@ -38,46 +327,193 @@ def compress_image(file_path, quality=60):
                 img.save(output_path)
 
             new_size = os.path.getsize(output_path)
-            savings = original_size - new_size
-            if savings > 0:
-                print(f"Compressed {filename}: {original_size/1024:.2f}KB -> {new_size/1024:.2f}KB (Saved {savings/1024:.2f}KB)")
-            else:
-                print(f"Processed {filename}: No size reduction.")
-                
+
+        return Result(file_path, original_size, new_size, None, output_path,
+                      file_digest(file_path) if digest else None, chosen, peak_rss(), note)
+
     except Exception as e:
-        print(f"Error compressing {file_path}: {e}")
+        return Result(file_path, 0, 0, str(e), None, None, None, peak_rss(), None)
+
+def compress_chunk(paths, options, digest):
+    """Worker task: compress a list of images, one Result per image."""
+    return [compress_image(path, digest=digest, **options) for path in paths]
+
+def report(result, show_memory=False):
+    filename = os.path.basename(result.path)
+    memory = f" [peak {result.peak_rss / 1024 / 1024:.0f}MB]" if show_memory and result.peak_rss else ""
+    if result.error:
+        print(f"Error compressing {result.path}: {result.error}{memory}")
+        return
+    savings = result.original_size - result.new_size
+    chosen = f", quality {result.quality}" if result.quality else ""
+    if savings > 0:
+        print(f"Compressed {filename}: {result.original_size/1024:.2f}KB -> {result.new_size/1024:.2f}KB (Saved {savings/1024:.2f}KB{chosen}){memory}")
+    else:
+        print(f"Processed {filename}: No size reduction.{memory}")
+    if result.note:
+        print(f"  Note: {result.note}")
+
+def run_pool(files, options, jobs, digest=False):
+    """Yield compress_image results in file order from a pool of `jobs` processes.
+
+    Files are submitted in chunks of CHUNK_SIZE with at most 2 * jobs chunks
+    in flight. If a worker dies (e.g. a decoder crash on a corrupt file), the
+    pool is restarted and the chunk that was lost is retried one file at a
+    time, so only the offending file is reported as failed.
+    """
+    chunks = (files[i:i + CHUNK_SIZE] for i in range(0, len(files), CHUNK_SIZE))
+    pool = ProcessPoolExecutor(max_workers=jobs)
+    pending = deque()
+    try:
+        while True:
+            while len(pending) < jobs * 2:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                pending.append((chunk, pool.submit(compress_chunk, chunk, options, digest)))
+            if not pending:
+                break
 
-def process_path(path, quality):
+            chunk, future = pending.popleft()
+            try:
+                yield from future.result()
+                continue
+            except BrokenProcessPool:
+                pass
+
+            pool.shutdown(wait=False, cancel_futures=True)
+            pool = ProcessPoolExecutor(max_workers=jobs)
+            for path in chunk:
+                try:
+                    yield pool.submit(compress_image, path, digest=digest, **options).result()
+                except BrokenProcessPool:
+                    yield Result(path, 0, 0, "worker process crashed while decoding", None, None, None, None, None)
+                    pool.shutdown(wait=False)
+                    pool = ProcessPoolExecutor(max_workers=jobs)
+            pending = deque((chunk, pool.submit(compress_chunk, chunk, options, digest)) for chunk, _ in pending)
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+def find_images(path, known_outputs=()):
+    """List supported images under path, leaving out this tool's own outputs."""
+    files = []
+    for root, _, names in os.walk(path):
+        for name in names:
+            ext = os.path.splitext(name)[1].lower()
+            if ext in SUPPORTED_FORMATS and not is_output(name):
+                file_path = os.path.join(root, name)
+                if file_path not in known_outputs:
+                    files.append(file_path)
+    return files
+
+def process_path(path, options, jobs=1, force=False):
+    """Compress one image or every image under a directory.
+
+    options holds compress_image's settings (quality, target_size, min_ssim,
+    max_dimension, memory_budget, oversize); they are also what the manifest
+    compares between runs.
+    """
     path = os.path.abspath(path)
     if os.path.isfile(path):
-        compress_image(path, quality)
+        if is_output(path):
+            print(f"Error: {path} is an output of this tool, not compressing it again.")
+            return
+        directory, files = os.path.dirname(path), [path]
     elif os.path.isdir(path):
         print(f"Processing directory: {path}")
-        for root, _, files in os.walk(path):
-            for file in files:
-                ext = os.path.splitext(file)[1].lower()
-                if ext in SUPPORTED_FORMATS:
-                    compress_image(os.path.join(root, file), quality)
+        directory, files = path, None
     else:
         print(f"Error: {path} not found.")
+        return
+
+    start = time.perf_counter()
+    manifest = None
+    try:
+        manifest = Manifest(directory)
+    except sqlite3.Error as e:
+        print(f"Error: Cannot open manifest in {directory}: {e}")
+    if files is None:
+        files = find_images(path, manifest.outputs if manifest else ())
+
+    # Settings that change the output; a source is redone when they differ
+    settings = json.dumps({key: value for key, value in options.items() if value is not None}, sort_keys=True)
+    skipped = 0
+    if manifest and not force:
+        todo = [file for file in files if not manifest.is_current(file, settings)]
+        skipped = len(files) - len(todo)
+        files = todo
+
+    digest = manifest is not None
+    if jobs > 1 and len(files) > 1:
+        results = run_pool(files, options, jobs, digest)
+    else:
+        results = (compress_image(file, digest=digest, **options) for file in files)
+
+    show_memory = bool(options.get("memory_budget"))
+    done = failed = saved = 0
+    peak = None
+    try:
+        for result in results:
+            if result is None:
+                continue
+            report(result, show_memory)
+            if result.peak_rss and (peak is None or result.peak_rss > peak[0]):
+                peak = (result.peak_rss, os.path.basename(result.path))
+            if result.error:
+                failed += 1
+            else:
+                done += 1
+                saved += result.original_size - result.new_size
+                if manifest:
+                    manifest.record(result, settings)
+    finally:
+        if manifest:
+            manifest.close()
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    if len(files) > 1 or skipped:
+        print(f"\n{done} image(s) compressed, {failed} failed, {skipped} unchanged skipped in {elapsed:.2f}s "
+              f"({done / elapsed:.1f} images/s), saved {saved / 1024 / 1024:.2f}MB in total.")
+    if show_memory and peak:
+        print(f"Highest peak memory: {peak[0] / 1024 / 1024:.0f}MB ({peak[1]}).")
+
+def parse_size(text):
+    """Parse a size such as 150000, 200K or 1.5M into bytes."""
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    text = text.strip().upper().removesuffix("B")
+    try:
+        if text and text[-1] in units:
+            return int(float(text[:-1]) * units[text[-1]])
+        return int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: '{text}'")
 
 def main():
     parser = argparse.ArgumentParser(description="Compress images in a file or directory.")
     parser.add_argument("path", help="File or directory to compress")
     parser.add_argument("--quality", type=int, default=60, help="Quality for JPEG/WEBP (1-100), default 60.")
-    
+    search = parser.add_mutually_exclusive_group()
+    search.add_argument("--target-size", type=parse_size,
+                        help="For JPEG/WEBP, use the highest quality whose file fits this size, e.g. 200K.")
+    search.add_argument("--min-ssim", type=float,
+                        help="For JPEG/WEBP, use the lowest quality that keeps SSIM at or above this value, e.g. 0.95.")
+    parser.add_argument("--max-dimension", type=int, help="Shrink images so their longest side is at most this many pixels.")
+    parser.add_argument("--memory-budget", type=int, metavar="MB",
+                        help="Large-image mode: keep decoding each image under about this many MB and report peak memory.")
+    parser.add_argument("--oversize", choices=["downscale", "refuse"], default="downscale",
+                        help="With --memory-budget, what to do with images over it: decode JPEGs at reduced scale "
+                             "(other formats are refused) or refuse them all. Default downscale.")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of worker processes, default 1.")
+    parser.add_argument("--force", action="store_true",
+                        help=f"Recompress every image, ignoring the {MANIFEST_NAME} manifest (it is still updated).")
+
     args = parser.parse_args()
-    
-    # Check for Pillow
-    try:
-        import PIL
-    except ImportError:
-        print("Error: Pillow library is not installed.")
-        print("Please install it using: pip install Pillow")
-        sys.exit(1)
 
-    process_path(args.path, args.quality)
+    options = {"quality": args.quality, "target_size": args.target_size,
+               "min_ssim": args.min_ssim, "max_dimension": args.max_dimension,
+               "memory_budget": args.memory_budget * 1024 * 1024 if args.memory_budget else None,
+               "oversize": args.oversize if args.memory_budget else None}
+    process_path(args.path, options, max(1, args.jobs), args.force)
 
 if __name__ == "__main__":
-    import sys
     main()
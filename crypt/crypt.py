@@ -4,8 +4,10 @@ Crypt.py - The Tiny Vault
 Simple symmetric file encryption using a password.
 
 Usage:
-    python3 crypt.py encrypt <file>
-    python3 crypt.py decrypt <file>
+    python3 crypt.py encrypt <file|dir>... [--jobs N] [--cipher aes-gcm|chacha20]
+    python3 crypt.py decrypt <file|dir>... [--jobs N] [--key-cache-ttl SEC]
+    python3 crypt.py cat <file.enc> [--offset N] [--length N]
+    python3 crypt.py bench [--size MB] [--jobs N [N ...]]
 
 Dependencies:
     pip install cryptography
@@ -15,55 +17,362 @@ import sys
 import os
 import getpass
 import base64
+import struct
+import argparse
+import tempfile
+import time
+import io
+import hashlib
+import mmap
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor
 
 try:
     from cryptography.fernet import Fernet
     from cryptography.hazmat.primitives import hashes
     from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
 except ImportError:
     print("Error: Missing dependency 'cryptography'.")
     print("Please install it running: pip install cryptography")
     sys.exit(1)
 
-def derive_key(password: str, salt: bytes) -> bytes:
-    """Derive a 32-byte key from the password using PBKDF2."""
+KDF_ITERATIONS = 480000
+
+# Streaming container (version 2):
+#
+#   header:   magic "TVAULT" | version | cipher id | PBKDF2 iterations |
+#             KDF salt (16) | file salt (16) | nonce prefix (7) | segment size
+#   segments: every segment_size bytes of plaintext -> ciphertext + 16-byte tag
+#
+# Segment i is sealed with nonce = prefix | i (4 bytes) | last flag (1 byte) and
+# the header as associated data, so reordering, dropping or truncating segments
+# fails authentication. Files written before this format are a 16-byte salt
+# followed by a single Fernet token; decrypt tells them apart by the magic.
+MAGIC = b"TVAULT"
+FORMAT_VERSION = 2
+HEADER = struct.Struct(">6sBBI16s16s7sI")
+TAG_SIZE = 16
+SEGMENT_SIZE = 1024 * 1024
+# How long batch decryption keeps derived master keys in memory
+KEY_CACHE_TTL = 300
+MAX_SEGMENTS = 2 ** 32
+CIPHERS = {
+    1: AESGCM,
+    2: ChaCha20Poly1305,
+}
+CIPHER_IDS = {"aes-gcm": 1, "chacha20": 2}
+
+Header = namedtuple("Header", "version cipher iterations kdf_salt file_salt nonce_prefix segment_size")
+
+
+def derive_master_key(password: str, salt: bytes, iterations: int = KDF_ITERATIONS) -> bytes:
+    """Derive a raw 32-byte key from the password using PBKDF2."""
     kdf = PBKDF2HMAC(
         algorithm=hashes.SHA256(),
         length=32,
         salt=salt,
-        iterations=480000,
+        iterations=iterations,
     )
-    return base64.urlsafe_b64encode(kdf.derive(password.encode()))
+    return kdf.derive(password.encode())
 
-def encrypt_file(filepath):
-    if not os.path.exists(filepath):
-        print(f"Error: File '{filepath}' not found.")
+def derive_key(password: str, salt: bytes) -> bytes:
+    """Derive a 32-byte Fernet key from the password using PBKDF2."""
+    return base64.urlsafe_b64encode(derive_master_key(password, salt))
+
+def derive_file_key(master_key: bytes, file_salt: bytes) -> bytes:
+    """Derive the per-file segment key from the master key using HKDF."""
+    hkdf = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=file_salt,
+        info=b"TinyVault v2 segment key",
+    )
+    return hkdf.derive(master_key)
+
+def segment_nonce(header: Header, index: int, last: bool) -> bytes:
+    return header.nonce_prefix + struct.pack(">I?", index, last)
+
+def new_header(cipher="aes-gcm", iterations=KDF_ITERATIONS, kdf_salt=None, segment_size=SEGMENT_SIZE):
+    return Header(FORMAT_VERSION, CIPHER_IDS[cipher], iterations, kdf_salt or os.urandom(16),
+                  os.urandom(16), os.urandom(7), segment_size)
+
+def pack_header(header: Header) -> bytes:
+    return HEADER.pack(MAGIC, *header)
+
+def read_header(f):
+    """Read a version 2 header from `f`, or return None (at offset 0) if there isn't one."""
+    data = f.read(HEADER.size)
+    if len(data) < HEADER.size or not data.startswith(MAGIC):
+        f.seek(0)
+        return None
+    header = Header(*HEADER.unpack(data)[1:])
+    if header.version != FORMAT_VERSION or header.cipher not in CIPHERS or header.segment_size <= 0:
+        raise ValueError("Unsupported container version or cipher")
+    return header
+
+class SegmentCipher:
+    """Seals and opens the segments of one container."""
+
+    def __init__(self, master_key: bytes, header: Header):
+        self.header = header
+        self.aad = pack_header(header)
+        self.aead = CIPHERS[header.cipher](derive_file_key(master_key, header.file_salt))
+
+    def seal(self, index, data, last):
+        return self.aead.encrypt(segment_nonce(self.header, index, last), data, self.aad)
+
+    def open(self, index, data, last):
+        return self.aead.decrypt(segment_nonce(self.header, index, last), data, self.aad)
+
+
+# Set in each worker process by _init_worker
+_worker_cipher = None
+
+def _init_worker(master_key, header):
+    global _worker_cipher
+    _worker_cipher = SegmentCipher(master_key, header)
+
+def _seal_segment(index, data, last):
+    return _worker_cipher.seal(index, data, last)
+
+def _open_segment(index, data, last):
+    return _worker_cipher.open(index, data, last)
+
+def read_segments(src, size):
+    """Yield (index, data, last) for consecutive `size`-byte blocks of `src`.
+
+    Always yields at least one (possibly empty) block. Reads one block ahead
+    so the final one can be flagged.
+    """
+    index = 0
+    data = src.read(size)
+    while True:
+        following = src.read(size) if len(data) == size else b""
+        last = not following
+        yield index, data, last
+        if last:
+            return
+        index += 1
+        if index >= MAX_SEGMENTS:
+            raise ValueError("File too large for this segment size")
+        data = following
+
+def run_segments(segments, dst, master_key, header, func, jobs):
+    """Apply `func` to every segment and write the results to `dst` in order.
+
+    With jobs > 1 segments are spread over a process pool; the AEAD calls hold
+    the GIL, so threads wouldn't help. Nonces depend only on the segment
+    index, so the output is identical to the single-process path.
+    """
+    if jobs <= 1:
+        _init_worker(master_key, header)
+        for index, data, last in segments:
+            dst.write(func(index, data, last))
         return
 
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(master_key, header)) as pool:
+        # Bound the segments in flight so memory stays constant
+        pending = deque()
+        for segment in segments:
+            pending.append(pool.submit(func, *segment))
+            if len(pending) >= jobs * 2:
+                dst.write(pending.popleft().result())
+        while pending:
+            dst.write(pending.popleft().result())
+
+def encrypt_stream(src, dst, master_key: bytes, header: Header, jobs=1):
+    """Encrypt everything readable from `src` into `dst`, one segment at a time."""
+    dst.write(pack_header(header))
+    run_segments(read_segments(src, header.segment_size), dst, master_key, header, _seal_segment, jobs)
+
+def decrypt_stream(src, dst, master_key: bytes, header: Header, jobs=1):
+    """Decrypt the segments following `header` in `src` into `dst`.
+
+    Raises cryptography.exceptions.InvalidTag if anything was altered,
+    reordered or cut off.
+    """
+    segments = read_segments(src, header.segment_size + TAG_SIZE)
+    run_segments(segments, dst, master_key, header, _open_segment, jobs)
+
+class KeyCache:
+    """Master keys by (KDF salt, iterations), kept for `ttl` seconds.
+
+    Files encrypted in one batch share a KDF salt, so decrypting the batch
+    runs PBKDF2 once instead of once per file. ttl=0 disables caching.
+    """
+
+    def __init__(self, password, ttl=KEY_CACHE_TTL):
+        self.password = password
+        self.ttl = ttl
+        self.keys = {}
+
+    def get(self, salt, iterations):
+        now = time.monotonic()
+        self.keys = {k: v for k, v in self.keys.items() if now - v[1] < self.ttl}
+        cached = self.keys.get((salt, iterations))
+        if cached:
+            return cached[0]
+        key = derive_master_key(self.password, salt, iterations)
+        if self.ttl > 0:
+            self.keys[(salt, iterations)] = (key, now)
+        return key
+
+    def clear(self):
+        self.keys.clear()
+
+
+class EncryptedReader(io.RawIOBase):
+    """Seekable, read-only plaintext view of a version 2 container.
+
+    The container is memory-mapped and a read only decrypts (and
+    authenticates) the segments it touches; the last one is kept around for
+    the next small read. Wrap it in io.BufferedReader for line reads.
+    Tampering is reported as InvalidTag by the read that hits it.
+    """
+
+    def __init__(self, path, password=None, master_key=None):
+        super().__init__()
+        self._file = open(path, "rb")
+        try:
+            header = read_header(self._file)
+            if header is None:
+                raise ValueError("Not a seekable container (legacy Fernet files can only be decrypted whole)")
+            if master_key is None:
+                master_key = derive_master_key(password, header.kdf_salt, header.iterations)
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self._file.close()
+            raise
+        self._cipher = SegmentCipher(master_key, header)
+        self._segment_size = header.segment_size
+        stored = header.segment_size + TAG_SIZE
+        body = len(self._mmap) - HEADER.size
+        self._segments = max(1, -(-body // stored))
+        if body < TAG_SIZE or body - (self._segments - 1) * stored < TAG_SIZE:
+            self.close()
+            raise ValueError("Truncated container")
+        self.size = body - self._segments * TAG_SIZE
+        self._pos = 0
+        self._cached = (None, b"")
+
+    def _segment(self, index):
+        if self._cached[0] != index:
+            stored = self._segment_size + TAG_SIZE
+            start = HEADER.size + index * stored
+            data = self._mmap[start:start + stored]
+            self._cached = (index, self._cipher.open(index, data, index == self._segments - 1))
+        return self._cached[1]
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self._pos = offset
+        return self._pos
+
+    def readinto(self, b):
+        view = memoryview(b).cast("B")
+        filled = 0
+        while filled < len(view) and self._pos < self.size:
+            index, skip = divmod(self._pos, self._segment_size)
+            data = self._segment(index)
+            n = min(len(view) - filled, len(data) - skip)
+            view[filled:filled + n] = data[skip:skip + n]
+            filled += n
+            self._pos += n
+        return filled
+
+    def close(self):
+        if not self.closed:
+            if hasattr(self, "_mmap"):
+                self._mmap.close()
+            self._file.close()
+        super().close()
+
+
+def decrypted_path(filepath):
+    # Remove .enc if present
+    if filepath.endswith(".enc"):
+        return filepath[:-4]
+    return filepath + ".decrypted"
+
+def encrypt_one(filepath, master_key, header, jobs=1):
+    """Encrypt `filepath` to `filepath`.enc under `header`. Returns the output path."""
+    # Output file: original.ext.enc
+    out_path = filepath + ".enc"
+    tmp_path = out_path + ".part"
+    try:
+        with open(filepath, "rb") as src, open(tmp_path, "wb") as dst:
+            encrypt_stream(src, dst, master_key, header, jobs)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return out_path
+
+def decrypt_one(filepath, keys, jobs=1):
+    """Decrypt `filepath` using master keys from `keys` (a KeyCache). Returns the output path."""
+    out_path = decrypted_path(filepath)
+    # Plaintext goes to a temp file until every segment has been authenticated
+    tmp_path = out_path + ".part"
+    try:
+        with open(filepath, "rb") as src:
+            header = read_header(src)
+            if header is None:
+                decrypt_legacy(src, tmp_path, keys.password)
+            else:
+                master_key = keys.get(header.kdf_salt, header.iterations)
+                with open(tmp_path, "wb") as dst:
+                    decrypt_stream(src, dst, master_key, header, jobs)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return out_path
+
+def ask_new_password():
     password = getpass.getpass("Enter password to encrypt: ")
     confirm = getpass.getpass("Confirm password: ")
     
     if password != confirm:
         print("Error: Passwords do not match.")
-        return
+        return None
+    return password
 
-    # Generate a random 16-byte salt
-    salt = os.urandom(16)
-    key = derive_key(password, salt)
-    f = Fernet(key)
+def encrypt_file(filepath, jobs=1, cipher="aes-gcm"):
+    if not os.path.exists(filepath):
+        print(f"Error: File '{filepath}' not found.")
+        return
 
-    with open(filepath, "rb") as file:
-        file_data = file.read()
+    password = ask_new_password()
+    if password is None:
+        return
 
-    encrypted_data = f.encrypt(file_data)
+    header = new_header(cipher)
+    master_key = derive_master_key(password, header.kdf_salt, header.iterations)
 
-    # Output file: original.ext.enc
-    out_path = filepath + ".enc"
-    
-    # Store salt as the first 16 bytes of the file
-    with open(out_path, "wb") as file:
-        file.write(salt)
-        file.write(encrypted_data)
+    try:
+        out_path = encrypt_one(filepath, master_key, header, jobs)
+    except (OSError, ValueError) as e:
+        print(f"Error: Encryption failed: {e}")
+        return
 
     print(f"[*] File encrypted successfully: {out_path}")
     print(f"[*] Note: Do not lose the password. There is no recovery.")
@@ -74,7 +383,7 @@ def encrypt_file(filepath):
     #     os.remove(filepath)
     #     print("Original file deleted.")
 
-def decrypt_file(filepath):
+def decrypt_file(filepath, jobs=1):
     if not os.path.exists(filepath):
         print(f"Error: File '{filepath}' not found.")
         return
@@ -82,49 +391,284 @@ def decrypt_file(filepath):
     password = getpass.getpass("Enter password to decrypt: ")
 
     try:
-        with open(filepath, "rb") as file:
-            # Read the salt (first 16 bytes)
-            salt = file.read(16)
-            encrypted_data = file.read()
+        out_path = decrypt_one(filepath, KeyCache(password, ttl=0), jobs)
+        print(f"[*] File decrypted successfully: {out_path}")
 
-        key = derive_key(password, salt)
-        f = Fernet(key)
-        
-        decrypted_data = f.decrypt(encrypted_data)
+    except Exception as e:
+        # Generic catch-all, but usually InvalidTag/InvalidToken means wrong password
+        print(f"Error: Decryption failed. Wrong password or corrupted file.")
+        # print(e) # Uncomment for debug
+
+def decrypt_legacy(src, out_path, password):
+    """Decrypt the original salt + Fernet token layout (whole file in memory)."""
+    # Read the salt (first 16 bytes)
+    salt = src.read(16)
+    encrypted_data = src.read()
+
+    key = derive_key(password, salt)
+    f = Fernet(key)
+
+    decrypted_data = f.decrypt(encrypted_data)
+
+    with open(out_path, "wb") as file:
+        file.write(decrypted_data)
+
+def is_partial_output(name, names):
+    """True if `name` is the temp file of an interrupted run over a sibling in `names`.
+
+    Encryption writes X.enc.part; decryption writes X.part for X.enc, or
+    X.decrypted.part for X. Other files ending in .part belong to the user.
+    """
+    if not name.endswith(".part"):
+        return False
+    out_path = name[:-5]
+    if out_path.endswith(".enc"):
+        return True
+    if out_path.endswith(".decrypted"):
+        return out_path[:-10] in names
+    return out_path + ".enc" in names
+
+def collect_files(paths, encrypted):
+    """Expand directories recursively into the files to process.
 
-        # Determine output filename
-        # Remove .enc if present
-        if filepath.endswith(".enc"):
-            out_path = filepath[:-4]
+    For encryption that's everything not already ending in .enc; for
+    decryption only .enc files are picked up from directories. Temp files
+    left by an interrupted run are skipped with a notice.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                present = set(names)
+                for name in sorted(names):
+                    if name.endswith(".enc") != encrypted:
+                        continue
+                    if is_partial_output(name, present):
+                        print(f"Skipping leftover temp file '{os.path.join(root, name)}'.")
+                        continue
+                    files.append(os.path.join(root, name))
+        elif os.path.isfile(path):
+            files.append(path)
         else:
-            out_path = filepath + ".decrypted"
+            print(f"Error: File '{path}' not found.")
+    return files
 
-        with open(out_path, "wb") as file:
-            file.write(decrypted_data)
+def _encrypt_job(filepath, master_key, header):
+    # Runs in a worker process: HKDF per file is cheap, PBKDF2 already happened
+    try:
+        encrypt_one(filepath, master_key, header)
+        return filepath, os.path.getsize(filepath), None
+    except (OSError, ValueError) as e:
+        return filepath, 0, str(e)
 
-        print(f"[*] File decrypted successfully: {out_path}")
+def _decrypt_job(filepath, keys):
+    try:
+        out_path = decrypt_one(filepath, keys)
+        return filepath, os.path.getsize(out_path), None
+    except Exception:
+        return filepath, 0, "Wrong password or corrupted file."
 
-    except Exception as e:
-        # Generic catch-all, but usually InvalidToken means wrong password
-        print(f"Error: Decryption failed. Wrong password or corrupted file.")
-        # print(e) # Uncomment for debug
+def run_batch(job, items, jobs):
+    """Run job(*item) for every item on `jobs` processes; report files/s at the end."""
+    start = time.perf_counter()
+    done = failed = total_bytes = 0
+    if jobs <= 1:
+        results = (job(*item) for item in items)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        results = pool.map(job, *zip(*items), chunksize=8) if items else []
+    try:
+        for filepath, size, error in results:
+            if error:
+                failed += 1
+                print(f"[!] {filepath}: {error}")
+            else:
+                done += 1
+                total_bytes += size
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(f"[*] {done} file(s) processed, {failed} failed, {total_bytes / 1e6:.1f} MB "
+          f"in {elapsed:.2f}s ({done / elapsed:.1f} files/s, {total_bytes / 1e6 / elapsed:.1f} MB/s)")
+
+def encrypt_batch(paths, jobs=1, cipher="aes-gcm"):
+    files = collect_files(paths, encrypted=False)
+    if not files:
+        print("Error: Nothing to encrypt.")
+        return
+    password = ask_new_password()
+    if password is None:
+        return
+
+    # One PBKDF2 run for the whole batch; every file still gets its own
+    # file salt (and so its own HKDF-derived key) and nonce prefix
+    kdf_salt = os.urandom(16)
+    master_key = derive_master_key(password, kdf_salt)
+    items = [(f, master_key, new_header(cipher, kdf_salt=kdf_salt)) for f in files]
+    run_batch(_encrypt_job, items, jobs)
+    print(f"[*] Note: Do not lose the password. There is no recovery.")
+
+def decrypt_batch(paths, jobs=1, key_cache_ttl=KEY_CACHE_TTL):
+    files = collect_files(paths, encrypted=True)
+    if not files:
+        print("Error: Nothing to decrypt.")
+        return
+    keys = KeyCache(getpass.getpass("Enter password to decrypt: "), key_cache_ttl)
+
+    # Derive each distinct master key up front, so workers get it ready-made
+    for filepath in files:
+        try:
+            with open(filepath, "rb") as src:
+                header = read_header(src)
+        except (OSError, ValueError):
+            continue
+        if header is not None:
+            keys.get(header.kdf_salt, header.iterations)
+    run_batch(_decrypt_job, [(f, keys) for f in files], jobs)
+    keys.clear()
+
+def cat_file(filepath, offset=0, length=None):
+    """Write `length` plaintext bytes from `offset` of an encrypted file to stdout."""
+    if not os.path.exists(filepath):
+        print(f"Error: File '{filepath}' not found.", file=sys.stderr)
+        return
+
+    password = getpass.getpass("Enter password to decrypt: ")
+    out = sys.stdout.buffer
+    try:
+        with EncryptedReader(filepath, password) as reader:
+            reader.seek(offset)
+            remaining = reader.size - offset if length is None else length
+            while remaining > 0:
+                data = reader.read(min(SEGMENT_SIZE, remaining))
+                if not data:
+                    break
+                out.write(data)
+                remaining -= len(data)
+        out.flush()
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+    except Exception:
+        print("Error: Decryption failed. Wrong password or corrupted file.", file=sys.stderr)
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(SEGMENT_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class HashingWriter:
+    """Write sink that only keeps a SHA-256 of what it is given."""
+
+    def __init__(self):
+        self.hash = hashlib.sha256()
+
+    def write(self, data):
+        self.hash.update(data)
+        return len(data)
+
+def benchmark(size_mb, job_counts):
+    """Encrypt and decrypt a temporary file of `size_mb` MB with each job count.
+
+    Afterwards (untimed) every job count's ciphertext must be byte-for-byte
+    the same, and must decrypt back to the original.
+    """
+    master_key = os.urandom(32)
+    header = new_header()
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = os.path.join(tmp, "plain")
+        enc = os.path.join(tmp, "enc")
+        with open(plain, "wb") as f:
+            block = os.urandom(SEGMENT_SIZE)
+            for _ in range(size_mb):
+                f.write(block)
+
+        print(f"[*] {size_mb} MB, segment size {SEGMENT_SIZE // 1024} KB, {os.cpu_count()} CPUs")
+        digests = set()
+        for jobs in job_counts:
+            start = time.perf_counter()
+            with open(plain, "rb") as src, open(enc, "wb") as dst:
+                encrypt_stream(src, dst, master_key, header, jobs)
+            encrypt_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            with open(enc, "rb") as src, open(os.devnull, "wb") as dst:
+                read_header(src)
+                decrypt_stream(src, dst, master_key, header, jobs)
+            decrypt_time = time.perf_counter() - start
+
+            gb = size_mb / 1024
+            print(f"    jobs={jobs:<3} encrypt {gb / encrypt_time:6.2f} GB/s   decrypt {gb / decrypt_time:6.2f} GB/s")
+            digests.add(file_sha256(enc))
+
+        sink = HashingWriter()
+        with open(enc, "rb") as src:
+            read_header(src)
+            decrypt_stream(src, sink, master_key, header, job_counts[-1])
+        identical = len(digests) == 1
+        round_trip = sink.hash.hexdigest() == file_sha256(plain)
+        print(f"[*] Ciphertext identical across job counts: {'yes' if identical else 'NO'}; "
+              f"round trip: {'ok' if round_trip else 'FAILED'}")
+        if not (identical and round_trip):
+            sys.exit(1)
 
 def main():
-    if len(sys.argv) != 3:
-        print(__doc__)
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Encrypt or decrypt files with a password.")
+    sub = parser.add_subparsers(dest="action", required=True)
+
+    enc = sub.add_parser("encrypt", help="Encrypt files to <file>.enc (directories are walked recursively)")
+    enc.add_argument("files", nargs="+")
+    enc.add_argument("--cipher", choices=sorted(CIPHER_IDS), default="aes-gcm", help="AEAD cipher (default: aes-gcm)")
+
+    dec = sub.add_parser("decrypt", help="Decrypt .enc files (directories are walked recursively)")
+    dec.add_argument("files", nargs="+")
+    dec.add_argument("--key-cache-ttl", type=int, default=KEY_CACHE_TTL,
+                     help=f"Seconds to keep derived keys for reuse across files, 0 to disable (default: {KEY_CACHE_TTL})")
+
+    cat = sub.add_parser("cat", help="Print a byte range of an encrypted file without decrypting the rest")
+    cat.add_argument("file")
+    cat.add_argument("--offset", type=int, default=0, help="First plaintext byte (default: 0)")
+    cat.add_argument("--length", type=int, default=None, help="Number of bytes (default: to the end)")
 
-    action = sys.argv[1]
-    target = sys.argv[2]
+    bench = sub.add_parser("bench", help="Measure encrypt/decrypt throughput per job count")
+    bench.add_argument("--size", type=int, default=2048, help="Test file size in MB (default: 2048)")
+    bench.add_argument("--jobs", type=int, nargs="+", default=None, help="Job counts to try (default: 1 2 4 ... CPUs)")
 
-    if action == "encrypt":
-        encrypt_file(target)
-    elif action == "decrypt":
-        decrypt_file(target)
+    for p in (enc, dec):
+        p.add_argument("-j", "--jobs", type=int, default=1,
+                       help="Worker processes: per segment for one file, per file for several (default: 1)")
+
+    args = parser.parse_args()
+
+    if args.action == "bench":
+        job_counts = args.jobs
+        if not job_counts:
+            job_counts = [1]
+            while job_counts[-1] * 2 <= (os.cpu_count() or 1):
+                job_counts.append(job_counts[-1] * 2)
+        benchmark(args.size, job_counts)
+        return
+
+    if args.action == "cat":
+        cat_file(args.file, args.offset, args.length)
+        return
+
+    single = len(args.files) == 1 and os.path.isfile(args.files[0])
+    if args.action == "encrypt":
+        if single:
+            encrypt_file(args.files[0], args.jobs, args.cipher)
+        else:
+            encrypt_batch(args.files, args.jobs, args.cipher)
     else:
-        print(f"Unknown command: {action}")
-        print(__doc__)
-        sys.exit(1)
+        if single:
+            decrypt_file(args.files[0], args.jobs)
+        else:
+            decrypt_batch(args.files, args.jobs, args.key_cache_ttl)
 
 if __name__ == "__main__":
     main()
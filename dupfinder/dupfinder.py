@@ -1,65 +1,672 @@
 import os
+import sys
+import json
+import time
+import mmap
 import hashlib
+import sqlite3
+import errno
+import fnmatch
 import argparse
+import threading
+from collections import namedtuple, deque
+from concurrent.futures import ThreadPoolExecutor
 
-def calculate_hash(file_path, chunk_size=8192):
-    """Calculates the SHA-256 hash of a file."""
-    sha256 = hashlib.sha256()
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Bytes hashed from the start, middle and end of a file in the partial stage
+PARTIAL_BLOCK = 4096
+
+# Read size for full digests; hashlib releases the GIL while hashing each read
+BUFFER_SIZE = 1024 * 1024
+
+# Digest algorithms for --hash; blake3 is offered when the package is installed
+HASHES = {"sha256": hashlib.sha256, "blake2b": hashlib.blake2b}
+if blake3:
+    HASHES["blake3"] = blake3.blake3
+
+DEFAULT_CACHE = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+                             "dupfinder", "hashes.sqlite")
+
+# Files modified this recently may change again within the same mtime tick,
+# so their digests are used but not cached
+RACY_WINDOW_NS = 2 * 10**9
+
+# ioctl number for cloning a whole file's extents (Linux, btrfs/XFS/...)
+FICLONE = 0x40049409
+
+FileEntry = namedtuple("FileEntry", "path dev ino size mtime_ns")
+
+class ScanStats:
+    """Counts candidates and bytes read per stage of the pipeline."""
+
+    STAGES = ("Scanned:", "Size:", "Partial hash:", "Full hash:")
+
+    def __init__(self):
+        self.counts = dict.fromkeys(self.STAGES, 0)
+        self.bytes_read = 0
+        self.bytes_total = 0
+        self.cache_hits = 0
+        self.hardlinks = 0
+        self.reclaimable = 0
+        self.reclaimed = 0
+        self.actions = 0
+        self.skipped = 0
+        self.lock = threading.Lock()
+
+    def add_read(self, nbytes):
+        with self.lock:
+            self.bytes_read += nbytes
+
+    def tally(self, stage, groups):
+        """Pass groups through, counting the files that survive `stage`."""
+        for group in groups:
+            self.counts[stage] += len(group[1])
+            yield group
+
+    def report(self, file=sys.stdout):
+        print("\nScan summary:", file=file)
+        print(f"  {'Scanned:':<13} {self.counts['Scanned:']:>9} files", file=file)
+        if self.hardlinks:
+            print(f"  Hardlinks:    {self.hardlinks:>9} extra paths collapsed", file=file)
+        for before, stage in zip(self.STAGES, self.STAGES[1:]):
+            before, after = self.counts[before], self.counts[stage]
+            print(f"  {stage:<13} {before:>9} candidates -> {after:>9} (eliminated {before - after})", file=file)
+        if self.bytes_total:
+            share = 100 * self.bytes_read / self.bytes_total
+            print(f"  Bytes read:   {self.bytes_read:,} of {self.bytes_total:,} ({share:.2f}%)", file=file)
+        if self.cache_hits:
+            print(f"  Cache hits:   {self.cache_hits}", file=file)
+        print(f"  Reclaimable:  {self.reclaimable:,} bytes", file=file)
+
+    def report_actions(self, dry_run, file=sys.stdout):
+        verb = "Would reclaim" if dry_run else "Reclaimed"
+        print(f"  {verb + ':':<13} {self.reclaimed:,} bytes ({self.actions} files, {self.skipped} skipped)", file=file)
+
+class HashCache:
+    """SQLite store of digests keyed by (device, inode, size, mtime_ns).
+
+    A row is only reused while the file's size and mtime are unchanged, so a
+    modified file is simply hashed again. Each row also records the last path
+    seen for the inode so that prune() can drop entries for deleted files.
+    """
+
+    FLUSH_EVERY = 1000
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS hashes (
+                dev INTEGER, ino INTEGER, kind TEXT,
+                size INTEGER, mtime_ns INTEGER, digest TEXT, path TEXT,
+                PRIMARY KEY (dev, ino, kind))""")
+        self.pending = []
+        self.cutoff = time.time_ns() - RACY_WINDOW_NS
+
+    def get(self, entry, kind):
+        row = self.db.execute(
+            "SELECT digest FROM hashes WHERE dev=? AND ino=? AND kind=? AND size=? AND mtime_ns=?",
+            (entry.dev, entry.ino, kind, entry.size, entry.mtime_ns)).fetchone()
+        return row[0] if row else None
+
+    def put(self, entry, kind, digest):
+        if entry.mtime_ns >= self.cutoff:
+            return
+        self.pending.append((entry.dev, entry.ino, kind, entry.size, entry.mtime_ns, digest, entry.path))
+        if len(self.pending) >= self.FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?)", self.pending)
+        self.pending = []
+
+    def prune(self):
+        """Delete rows whose path is gone or now holds a different file."""
+        stale = []
+        for dev, ino, size, mtime_ns, path in self.db.execute(
+                "SELECT DISTINCT dev, ino, size, mtime_ns, path FROM hashes"):
+            try:
+                st = os.stat(path)
+            except OSError:
+                stale.append((dev, ino))
+                continue
+            if (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns) != (dev, ino, size, mtime_ns):
+                stale.append((dev, ino))
+        with self.db:
+            self.db.executemany("DELETE FROM hashes WHERE dev=? AND ino=?", stale)
+        self.db.execute("VACUUM")
+        return len(stale)
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+def ordered_map(executor, func, items, window):
+    """Like executor.map, but with at most `window` calls queued at once."""
+    pending = deque()
+    for item in items:
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        pending.append(executor.submit(func, item))
+    while pending:
+        yield pending.popleft().result()
+
+def digest_entries(entries, kind, compute, cache, stats, mapper=map):
+    """Yield compute(entry) for every entry, in order, using cached digests where valid.
+
+    Cache lookups and stores stay on the calling thread; only compute() runs
+    through mapper.
+    """
+    def lookup(entry):
+        digest = cache.get(entry, kind) if cache else None
+        if digest:
+            stats.cache_hits += 1
+        return entry, digest
+
+    def resolve(item):
+        entry, digest = item
+        return entry, digest, digest or compute(entry)
+
+    for entry, cached_digest, digest in mapper(resolve, map(lookup, entries)):
+        if digest and cache and not cached_digest:
+            cache.put(entry, kind, digest)
+        yield digest
+
+def calculate_hash(file_path, algorithm="sha256", buffer_size=BUFFER_SIZE, use_mmap=False, stats=None):
+    """Calculates the digest of a file (SHA-256 by default).
+
+    Reads go into one reused buffer; with use_mmap the whole file is mapped
+    and hashed in a single update instead.
+    """
+    digest = HASHES[algorithm]()
     try:
-        with open(file_path, 'rb') as f:
-            while True:
-                data = f.read(chunk_size)
-                if not data:
-                    break
-                sha256.update(data)
-        return sha256.hexdigest()
+        with open(file_path, 'rb', buffering=0) as f:
+            if use_mmap:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                    digest.update(m)
+                    if stats:
+                        stats.add_read(len(m))
+            else:
+                buffer = bytearray(buffer_size)
+                view = memoryview(buffer)
+                while True:
+                    n = f.readinto(buffer)
+                    if not n:
+                        break
+                    digest.update(view[:n])
+                    if stats:
+                        stats.add_read(n)
+        return digest.hexdigest()
+    except (OSError, ValueError) as e:
+        print(f"Error reading {file_path}: {e}", file=sys.stderr)
+        return None
+
+def calculate_partial_hash(file_path, size, algorithm="sha256", block=PARTIAL_BLOCK, stats=None):
+    """Hashes the first, middle and last `block` bytes of a file.
+
+    Files of up to 3 * block bytes are hashed whole, so for them the partial
+    hash is already the full digest.
+    """
+    if size <= 3 * block:
+        return calculate_hash(file_path, algorithm, stats=stats)
+    digest = HASHES[algorithm]()
+    try:
+        with open(file_path, 'rb', buffering=0) as f:
+            for offset in (0, (size - block) // 2, size - block):
+                data = os.pread(f.fileno(), block, offset)
+                digest.update(data)
+                if stats:
+                    stats.add_read(len(data))
+        return digest.hexdigest()
     except OSError as e:
-        print(f"Error reading {file_path}: {e}")
+        print(f"Error reading {file_path}: {e}", file=sys.stderr)
         return None
 
-def find_duplicates(directory):
+def parse_size(text):
+    """Parse a size such as 4096, 64K, 10M or 2G into bytes."""
+    units = {"K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+    text = text.strip().upper().removesuffix("B")
+    try:
+        if text and text[-1] in units:
+            return int(float(text[:-1]) * units[text[-1]])
+        return int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: '{text}'")
+
+def is_excluded(name, rel_path, excludes):
+    return any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(rel_path, pattern) for pattern in excludes)
+
+def scan_tree(directory, excludes=()):
+    """Yield (path, stat) for every regular file under directory.
+
+    Uses os.scandir and DirEntry.stat(), so each file costs one stat call.
+    Symlinks are not followed. Exclude globs are matched against both the
+    name and the path relative to directory; an excluded directory is not
+    descended into.
+    """
+    stack = [(directory, "")]
+    while stack:
+        top, rel_top = stack.pop()
+        try:
+            with os.scandir(top) as it:
+                for entry in it:
+                    rel_path = os.path.join(rel_top, entry.name) if excludes else None
+                    if excludes and is_excluded(entry.name, rel_path, excludes):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append((entry.path, rel_path))
+                        elif entry.is_file(follow_symlinks=False):
+                            yield entry.path, entry.stat(follow_symlinks=False)
+                    except OSError as e:
+                        print(f"Error reading {entry.path}: {e}", file=sys.stderr)
+        except OSError as e:
+            print(f"Error reading {top}: {e}", file=sys.stderr)
+
+def group_by_size(directory, stats, excludes=(), min_size=1, max_size=None):
+    """Map file size -> list of FileEntry, and (dev, ino) -> extra hardlink paths.
+
+    Paths sharing an inode are one file on disk, so only the first one seen
+    becomes a candidate; the others are returned as its hardlinks.
+    """
+    sizes = {}
+    inodes = set()
+    links = {}
+    for file_path, st in scan_tree(directory, excludes):
+        # Empty files are skipped unless --min-size 0 is given
+        if st.st_size < min_size or (max_size is not None and st.st_size > max_size):
+            continue
+
+        inode = (st.st_dev, st.st_ino)
+        if inode in inodes:
+            links.setdefault(inode, []).append(file_path)
+            stats.hardlinks += 1
+            continue
+        inodes.add(inode)
+
+        stats.counts["Scanned:"] += 1
+        stats.bytes_total += st.st_size
+        entry = FileEntry(file_path, st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        sizes.setdefault(st.st_size, []).append(entry)
+    return sizes, links
+
+def refine(groups, key, skip=None):
+    """Split each (size, entries, ...) group by digest; yield groups with duplicates.
+
+    key(entries) yields one digest per entry for a lazy stream of all
+    entries, so a whole stage is hashed through one pool and each group is
+    yielded as soon as its last digest arrives. Groups whose size matches
+    skip(size) are passed through unchanged.
+    """
+    pending = deque()
+
+    def entries():
+        for group in groups:
+            pending.append(group)
+            if not (skip and skip(group[0])):
+                yield from group[1]
+
+    def skipped():
+        while pending and skip and skip(pending[0][0]):
+            yield pending.popleft()
+
+    buckets, taken = {}, 0
+    for value in key(entries()):
+        yield from skipped()
+        size, group = pending[0][0], pending[0][1]
+        if value:
+            buckets.setdefault(value, []).append(group[taken])
+        taken += 1
+        if taken == len(group):
+            pending.popleft()
+            for value, bucket in buckets.items():
+                if len(bucket) > 1:
+                    yield size, bucket, value
+            buckets, taken = {}, 0
+    yield from skipped()
+
+def scan_duplicates(directory, stats, cache=None, algorithm="sha256", jobs=1, buffer_size=BUFFER_SIZE,
+                    use_mmap=False, excludes=(), min_size=1, max_size=None):
+    """Yield (digest, size, entries, links) for each duplicate group as it is confirmed."""
+    executor = ThreadPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    mapper = (lambda func, items: ordered_map(executor, func, items, jobs * 4)) if executor else map
+    # Cache rows from before --hash existed are SHA-256 and keep their plain kind
+    suffix = "" if algorithm == "sha256" else f":{algorithm}"
+
+    def partial(entries):
+        compute = lambda entry: calculate_partial_hash(entry.path, entry.size, algorithm, stats=stats)
+        return digest_entries(entries, "partial" + suffix, compute, cache, stats, mapper)
+
+    def full(entries):
+        compute = lambda entry: calculate_hash(entry.path, algorithm, buffer_size, use_mmap, stats=stats)
+        return digest_entries(entries, "full" + suffix, compute, cache, stats, mapper)
+
+    try:
+        # Stage 1: only files sharing a size can be duplicates
+        sizes, links = group_by_size(directory, stats, excludes, min_size, max_size)
+        groups = stats.tally("Size:", ((size, entries) for size, entries in sizes.items() if len(entries) > 1))
+
+        # Stage 2: a few KB from the start, middle and end
+        groups = stats.tally("Partial hash:", refine(groups, partial))
+
+        # Stage 3: full digest, unless the partial hash already covered the whole file
+        groups = stats.tally("Full hash:", refine(groups, full, skip=lambda size: size <= 3 * PARTIAL_BLOCK))
+
+        for size, entries, digest in groups:
+            yield digest, size, entries, {entry.path: links.get((entry.dev, entry.ino), []) for entry in entries}
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+
+def same_contents(path_a, path_b, buffer_size=BUFFER_SIZE):
+    """Compare two files byte by byte."""
+    with open(path_a, 'rb', buffering=0) as a, open(path_b, 'rb', buffering=0) as b:
+        while True:
+            chunk_a = a.read(buffer_size)
+            chunk_b = b.read(buffer_size)
+            if chunk_a != chunk_b:
+                return False
+            if not chunk_a:
+                return True
+
+def temp_path(path):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.dupfinder-tmp")
+
+def link_over(src, path):
+    """Atomically replace path with a hardlink to src."""
+    tmp = temp_path(path)
+    os.link(src, tmp)
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        os.unlink(tmp)
+        raise
+
+def clone_into(src, path):
+    """Make path share src's extents (FICLONE), keeping path's inode and timestamps."""
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflinks are not supported on this platform")
+    st = os.stat(path)
+    with open(src, 'rb') as s, open(path, 'r+b') as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+def copy_verified(src, dst, digest, algorithm, in_place=False):
+    """Copy src into dst, checking the copied bytes against digest.
+
+    Unless in_place, the copy is written to a temporary file that replaces
+    dst only once it has been verified.
+    """
+    target = dst if in_place else temp_path(dst)
+    hasher = HASHES[algorithm]()
+    try:
+        with open(src, 'rb') as s, open(target, 'r+b' if in_place else 'xb') as d:
+            while True:
+                chunk = s.read(BUFFER_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                d.write(chunk)
+            d.truncate()
+            d.flush()
+            os.fsync(d.fileno())
+        if hasher.hexdigest() != digest:
+            raise OSError(errno.EIO, f"'{src}' no longer matches the journaled digest")
+        if not in_place:
+            os.replace(target, dst)
+    except BaseException:
+        if not in_place and os.path.exists(target):
+            os.unlink(target)
+        raise
+
+class Deduper:
+    """Replaces or deletes duplicates in each confirmed group.
+
+    One file per group is kept according to the keep policy. Every other
+    inode is re-checked byte for byte against it right before the action,
+    and a journal record is written and fsynced before anything changes so
+    that undo_journal() can restore the duplicate as an independent copy.
+    """
+
+    def __init__(self, action, stats, keep="oldest", keep_dir=None, dry_run=False,
+                 journal_path=None, algorithm="sha256", log=sys.stdout):
+        self.action = action
+        self.stats = stats
+        self.keep = keep
+        self.keep_dir = os.path.join(os.path.abspath(keep_dir), "") if keep_dir else None
+        self.dry_run = dry_run
+        self.algorithm = algorithm
+        self.log = log
+        self.journal = None
+        if not dry_run:
+            self.journal = open(journal_path, 'a')
+            print(f"Undo journal: {os.path.abspath(journal_path)}", file=log)
+
+    def choose_keeper(self, entries):
+        candidates = entries
+        if self.keep_dir:
+            candidates = [entry for entry in entries if entry.path.startswith(self.keep_dir)]
+            if not candidates:
+                return None
+        if self.keep == "shortest":
+            return min(candidates, key=lambda entry: (len(entry.path), entry.path))
+        return min(candidates, key=lambda entry: (entry.mtime_ns, entry.path))
+
+    def unchanged(self, entry):
+        try:
+            st = os.stat(entry.path)
+        except OSError:
+            return False
+        return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns) == (entry.dev, entry.ino, entry.size, entry.mtime_ns)
+
+    def record(self, entry, paths, keeper, digest):
+        st = os.stat(entry.path)
+        record = {"action": self.action, "paths": paths, "keeper": keeper.path, "size": entry.size,
+                  "hash": digest, "algorithm": self.algorithm, "mode": st.st_mode & 0o7777,
+                  "uid": st.st_uid, "gid": st.st_gid, "atime_ns": st.st_atime_ns, "mtime_ns": st.st_mtime_ns}
+        self.journal.write(json.dumps(record) + "\n")
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+
+    def process(self, digest, entries, links):
+        keeper = self.choose_keeper(entries)
+        if keeper is None:
+            print(f"Skipping group {digest[:8]}...: no copy under {self.keep_dir}", file=self.log)
+            self.stats.skipped += len(entries) - 1
+            return
+
+        for entry in entries:
+            if entry is keeper:
+                continue
+            paths = [entry.path] + links[entry.path]
+            if self.dry_run:
+                print(f"Would {self.action} {entry.path} (keeping {keeper.path})", file=self.log)
+                self.stats.actions += 1
+                self.stats.reclaimed += entry.size
+                continue
+            try:
+                if not (self.unchanged(keeper) and self.unchanged(entry)):
+                    raise OSError(errno.ESTALE, "file changed since it was scanned")
+                if not same_contents(keeper.path, entry.path):
+                    raise OSError(errno.EIO, f"contents differ from '{keeper.path}'")
+                self.record(entry, paths, keeper, digest)
+                for path in paths:
+                    if self.action == "hardlink":
+                        link_over(keeper.path, path)
+                    elif self.action == "delete":
+                        os.unlink(path)
+                if self.action == "reflink":
+                    clone_into(keeper.path, entry.path)
+            except OSError as e:
+                print(f"Error: Cannot {self.action} {entry.path}: {e}", file=sys.stderr)
+                self.stats.skipped += 1
+                continue
+            print(f"{self.action.capitalize()}: {entry.path} (kept {keeper.path})", file=self.log)
+            self.stats.actions += 1
+            self.stats.reclaimed += entry.size
+
+    def close(self):
+        if self.journal:
+            self.journal.close()
+
+def undo_journal(journal_path):
+    """Restore every duplicate recorded in a journal, newest first."""
+    try:
+        with open(journal_path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    except (OSError, ValueError) as e:
+        print(f"Error: Cannot read journal '{journal_path}': {e}", file=sys.stderr)
+        return
+
+    restored = 0
+    for record in reversed(records):
+        keeper, paths = record["keeper"], record["paths"]
+        try:
+            if record["action"] == "reflink":
+                # Same inode, shared extents: rewriting the data unshares them
+                copy_verified(keeper, paths[0], record["hash"], record["algorithm"], in_place=True)
+                pending = []
+            else:
+                # Restore paths that were deleted or still point at the keeper
+                pending = [path for path in paths
+                           if not os.path.lexists(path) or os.path.samefile(path, keeper)]
+                if not pending:
+                    continue
+                copy_verified(keeper, pending[0], record["hash"], record["algorithm"])
+            first = pending[0] if pending else paths[0]
+            os.chmod(first, record["mode"])
+            try:
+                os.chown(first, record["uid"], record["gid"])
+            except PermissionError:
+                pass
+            os.utime(first, ns=(record["atime_ns"], record["mtime_ns"]))
+            for path in pending[1:]:
+                link_over(first, path)
+        except OSError as e:
+            print(f"Error: Cannot restore {paths[0]}: {e}", file=sys.stderr)
+            continue
+        print(f"Restored: {paths[0]}")
+        restored += 1
+    print(f"\nRestored {restored} of {len(records)} journaled files.")
+
+def find_duplicates(directory, cache=None, algorithm="sha256", jobs=1, buffer_size=BUFFER_SIZE, use_mmap=False,
+                    excludes=(), min_size=1, max_size=None, output="text", action=None, keep="oldest",
+                    keep_dir=None, dry_run=False, journal_path=None):
     directory = os.path.abspath(directory)
     if not os.path.exists(directory):
-        print(f"Error: Directory '{directory}' does not exist.")
+        print(f"Error: Directory '{directory}' does not exist.", file=sys.stderr)
         return
 
-    print(f"Scanning for duplicates in: {directory}")
-    
-    hashes = {} # Map hash -> list of file paths
-    
-    for root, _, files in os.walk(directory):
-        for filename in files:
-            file_path = os.path.join(root, filename)
-            
-            # Skip empty files (optional, but usually desired)
-            if os.path.getsize(file_path) == 0:
-                continue
-
-            file_hash = calculate_hash(file_path)
-            
-            if file_hash:
-                if file_hash in hashes:
-                    hashes[file_hash].append(file_path)
-                else:
-                    hashes[file_hash] = [file_path]
+    # In jsonl mode stdout carries only the groups; everything else goes to stderr
+    log = sys.stderr if output == "jsonl" else sys.stdout
+    print(f"Scanning for duplicates in: {directory}", file=log)
+    stats = ScanStats()
+    deduper = None
+    if action:
+        journal_path = journal_path or f"dupfinder-undo-{time.strftime('%Y%m%d-%H%M%S')}.jsonl"
+        try:
+            deduper = Deduper(action, stats, keep, keep_dir, dry_run, journal_path, algorithm, log)
+        except OSError as e:
+            print(f"Error: Cannot open journal '{journal_path}': {e}", file=sys.stderr)
+            return
 
     duplicates_found = False
-    for file_hash, file_list in hashes.items():
-        if len(file_list) > 1:
-            duplicates_found = True
-            print(f"\nDuplicate found (Hash: {file_hash[:8]}...):")
-            for path in file_list:
-                print(f"  - {path}")
+    for digest, size, entries, links in scan_duplicates(directory, stats, cache, algorithm, jobs, buffer_size,
+                                                        use_mmap, excludes, min_size, max_size):
+        duplicates_found = True
+        stats.reclaimable += (len(entries) - 1) * size
+        if output == "jsonl":
+            record = {"hash": digest, "algorithm": algorithm, "size": size,
+                      "files": [entry.path for entry in entries]}
+            hardlinks = {path: extra for path, extra in links.items() if extra}
+            if hardlinks:
+                record["hardlinks"] = hardlinks
+            print(json.dumps(record), flush=True)
+        else:
+            print(f"\nDuplicate found (Hash: {digest[:8]}...):")
+            for entry in entries:
+                print(f"  - {entry.path}")
+                for path in links[entry.path]:
+                    print(f"    = {path} (hardlink)")
+            sys.stdout.flush()
+        if deduper:
+            deduper.process(digest, entries, links)
 
     if not duplicates_found:
-        print("\nNo duplicate files found.")
+        print("\nNo duplicate files found.", file=log)
+
+    stats.report(log)
+    if deduper:
+        stats.report_actions(dry_run, log)
+        deduper.close()
 
 def main():
     parser = argparse.ArgumentParser(description="Find duplicate files in a directory.")
     parser.add_argument("directory", nargs="?", default=".", help="The directory to scan (default: current directory)")
-    
+    parser.add_argument("--exclude", action="append", default=[], metavar="GLOB",
+                        help="Skip files and directories matching GLOB by name or relative path (repeatable)")
+    parser.add_argument("--min-size", type=parse_size, default=1,
+                        help="Ignore files smaller than this, e.g. 4K or 10M (default: 1, skipping empty files)")
+    parser.add_argument("--max-size", type=parse_size, help="Ignore files larger than this")
+    parser.add_argument("--format", choices=["text", "jsonl"], default="text",
+                        help="Output format; jsonl writes one JSON object per group as soon as it is confirmed")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of files hashed in parallel (default: 1)")
+    parser.add_argument("--hash", choices=sorted(HASHES), default="sha256", help="Digest algorithm (default: sha256)")
+    parser.add_argument("--buffer-size", type=int, default=BUFFER_SIZE // 1024,
+                        help=f"Read buffer for full digests in KiB (default: {BUFFER_SIZE // 1024})")
+    parser.add_argument("--mmap", action="store_true", help="Hash memory-mapped files instead of reading them")
+    parser.add_argument("--action", choices=["hardlink", "reflink", "delete"],
+                        help="Replace duplicates with hardlinks or reflinks to the kept file, or delete them")
+    parser.add_argument("--keep", choices=["oldest", "shortest"], default="oldest",
+                        help="Which file of a group to keep: oldest mtime or shortest path (default: oldest)")
+    parser.add_argument("--keep-dir", metavar="DIR", help="Keep the copy under DIR; groups without one are skipped")
+    parser.add_argument("--dry-run", action="store_true", help="Show what --action would do and how much space it would free")
+    parser.add_argument("--journal", metavar="FILE", help="Undo journal for --action (default: dupfinder-undo-<time>.jsonl)")
+    parser.add_argument("--undo", metavar="JOURNAL", help="Restore the files recorded in an undo journal and exit")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help=f"Digest cache file (default: {DEFAULT_CACHE})")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the digest cache")
+    parser.add_argument("--prune-cache", action="store_true", help="Drop cache entries for deleted or changed files before scanning")
+
     args = parser.parse_args()
-    find_duplicates(args.directory)
+    log = sys.stderr if args.format == "jsonl" else sys.stdout
+
+    if args.undo:
+        undo_journal(args.undo)
+        return
+    if (args.dry_run or args.keep_dir) and not args.action:
+        parser.error("--dry-run and --keep-dir require --action")
+
+    cache = None
+    if not args.no_cache:
+        try:
+            cache = HashCache(args.cache)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Error: Cannot open cache '{args.cache}': {e}", file=sys.stderr)
+    if cache and args.prune_cache:
+        print(f"Pruned cache entries for {cache.prune()} deleted or changed files.", file=log)
+
+    try:
+        find_duplicates(args.directory, cache, args.hash, max(1, args.jobs), args.buffer_size * 1024, args.mmap,
+                        args.exclude, args.min_size, args.max_size, args.format, args.action, args.keep,
+                        args.keep_dir, args.dry_run, args.journal)
+    finally:
+        if cache:
+            cache.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,118 @@
+"""Regression checks for --action and --undo.
+
+Run with `python3 -m unittest test_dupfinder` from this directory.
+"""
+
+import io
+import os
+import tempfile
+import unittest
+import contextlib
+
+import dupfinder
+
+
+def quietly(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()) as out, contextlib.redirect_stderr(io.StringIO()) as err:
+        fn(*args, **kwargs)
+    return out.getvalue() + err.getvalue()
+
+
+class DedupeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(os.path.realpath(self.tmp.name), "tree")
+        self.journal = os.path.join(os.path.realpath(self.tmp.name), "undo.jsonl")
+        os.makedirs(self.root)
+        data = os.urandom(50000)
+        # keeper.bin is the oldest, so --keep oldest keeps it
+        self.keeper = self.make("keeper.bin", data, mtime=1_000_000_000)
+        self.copy = self.make("sub/copy.bin", data, mtime=1_100_000_000, mode=0o600)
+        self.linked = self.make("linked.bin", data, mtime=1_200_000_000)
+        self.link = os.path.join(self.root, "sub/linked-hardlink.bin")
+        os.link(self.linked, self.link)
+        self.other = self.make("other.bin", os.urandom(50000))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make(self, name, data, mtime=None, mode=None):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        if mode is not None:
+            os.chmod(path, mode)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def snapshot(self):
+        """(contents, mode, mtime) of every file, and which paths share an inode."""
+        files, inodes = {}, {}
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                st = os.stat(path)
+                with open(path, "rb") as f:
+                    files[path] = (f.read(), st.st_mode, st.st_mtime_ns)
+                inodes.setdefault(st.st_ino, set()).add(path)
+        return files, sorted(sorted(paths) for paths in inodes.values())
+
+    def dedupe(self, action, dry_run=False):
+        return quietly(dupfinder.find_duplicates, self.root, action=action, dry_run=dry_run,
+                       journal_path=self.journal)
+
+    def undo(self):
+        return quietly(dupfinder.undo_journal, self.journal)
+
+    def test_hardlink_and_undo_round_trip(self):
+        before = self.snapshot()
+        self.dedupe("hardlink")
+        ino = os.stat(self.keeper).st_ino
+        for path in (self.copy, self.linked, self.link):
+            self.assertEqual(os.stat(path).st_ino, ino)
+
+        self.undo()
+        self.assertEqual(self.snapshot(), before)
+
+    def test_delete_and_undo_round_trip(self):
+        before = self.snapshot()
+        self.dedupe("delete")
+        for path in (self.copy, self.linked, self.link):
+            self.assertFalse(os.path.lexists(path))
+        self.assertTrue(os.path.exists(self.keeper))
+
+        self.undo()
+        self.assertEqual(self.snapshot(), before)
+
+    def test_changed_file_is_left_alone(self):
+        stats = dupfinder.ScanStats()
+        groups = list(dupfinder.scan_duplicates(self.root, stats))
+        self.assertEqual(len(groups), 1)
+        # Rewritten between the scan and the action
+        with open(self.copy, "r+b") as f:
+            f.write(b"changed")
+        before = self.snapshot()
+
+        deduper = dupfinder.Deduper("delete", stats, journal_path=self.journal, log=io.StringIO())
+        try:
+            for digest, _, entries, links in groups:
+                quietly(deduper.process, digest, entries, links)
+        finally:
+            deduper.close()
+        files, _ = self.snapshot()
+        self.assertEqual(files[self.copy], before[0][self.copy])
+        self.assertEqual(stats.skipped, 1)
+
+    def test_dry_run_changes_nothing(self):
+        before = self.snapshot()
+        out = self.dedupe("delete", dry_run=True)
+        self.assertIn("Would delete", out)
+        self.assertEqual(self.snapshot(), before)
+        self.assertFalse(os.path.exists(self.journal))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark for organizer.py on a synthetic flat directory.
+
+Usage:
+    python3 bench.py [--files N] [--collisions PERCENT] [--dir PATH]
+
+Builds the same directory twice: once for the original per-file loop
+(category list scans, isdir/exists per item, an exists loop per name
+collision, shutil.move) and once for organize_directory(). Times the
+planning and the whole run, and checks that both leave every file
+organized.
+"""
+
+import os
+import sys
+import time
+import shutil
+import random
+import argparse
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import organizer
+
+EXTENSIONS = [".jpg", ".png", ".pdf", ".txt", ".docx", ".mp3", ".mp4", ".zip", ".tar.gz",
+              ".py", ".json", ".exe", ".dat", ".bin", ""]
+
+
+def build_tree(root, files, collisions, seed):
+    """Create `files` empty files in root, with `collisions` percent of names already taken."""
+    rng = random.Random(seed)
+    os.makedirs(root)
+    for i in range(files):
+        name = f"download-{i:07d}{rng.choice(EXTENSIONS)}"
+        open(os.path.join(root, name), "w").close()
+        if rng.random() * 100 < collisions:
+            # Same name already in the category folder, sometimes with _1 taken too
+            folder = os.path.join(root, organizer.classify(name)[0])
+            os.makedirs(folder, exist_ok=True)
+            open(os.path.join(folder, name), "w").close()
+            if rng.random() < 0.2:
+                base, ext = os.path.splitext(name)
+                open(os.path.join(folder, f"{base}_1{ext}"), "w").close()
+
+
+def legacy_organize(directory, move=True):
+    """The original organizer's loop; with move=False it only makes the same decisions."""
+    for item in os.listdir(directory):
+        item_path = os.path.join(directory, item)
+        if os.path.isdir(item_path):
+            continue
+        _, extension = os.path.splitext(item)
+        extension = extension.lower()
+        destination_category = None
+        for category, extensions in organizer.FILE_TYPES.items():
+            if extension in extensions:
+                destination_category = category
+                break
+        if not destination_category:
+            destination_category = organizer.OTHERS
+        destination_folder = os.path.join(directory, destination_category)
+        if not os.path.exists(destination_folder) and move:
+            os.makedirs(destination_folder)
+        destination_path = os.path.join(destination_folder, item)
+        if os.path.exists(destination_path):
+            base, ext = os.path.splitext(item)
+            counter = 1
+            while os.path.exists(destination_path):
+                destination_path = os.path.join(destination_folder, f"{base}_{counter}{ext}")
+                counter += 1
+        if move:
+            shutil.move(item_path, destination_path)
+            print(f"Moved: {item} -> {destination_category}/")
+
+
+def leftover_files(directory):
+    return sum(1 for entry in os.scandir(directory) if entry.is_file() and not entry.name.startswith("."))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark organizer.py on a synthetic directory.")
+    parser.add_argument("--files", type=int, default=100000, help="Files to create (default: 100000)")
+    parser.add_argument("--collisions", type=float, default=5,
+                        help="Percent of names already taken in their category folder (default: 5)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed (default: 1)")
+    parser.add_argument("--dir", help="Build the trees here instead of in a temporary directory")
+    args = parser.parse_args()
+    files = max(1, args.files)
+
+    print(f"[*] {files} files, {args.collisions:g}% name collisions")
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp, open(os.devnull, "w") as devnull:
+        results = []
+        for label in ("original", "current"):
+            root = os.path.join(tmp, label)
+            build_tree(root, files, args.collisions, args.seed)
+
+            start = time.perf_counter()
+            if label == "original":
+                legacy_organize(root, move=False)
+            else:
+                organizer.plan_moves(root, root, False, False, None, 1)
+            plan_time = time.perf_counter() - start
+
+            # Per-file output is part of the cost being measured, so it is kept, just not shown
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(devnull):
+                if label == "original":
+                    legacy_organize(root)
+                else:
+                    organizer.organize_directory(root, journal=False)
+            run_time = time.perf_counter() - start
+
+            left = leftover_files(root)
+            results.append(left)
+            print(f"    {label:<9} plan {plan_time:7.2f}s   organize {run_time:7.2f}s   left unorganized: {left}")
+            shutil.rmtree(root)
+
+    if any(results):
+        print("Error: some files were not organized.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
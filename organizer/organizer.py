@@ -1,7 +1,20 @@
 import os
+import sys
+import json
+import time
+import re
+import zlib
+import errno
 import shutil
+import filecmp
+import signal
+import struct
+import sqlite3
 import argparse
-import sys
+import selectors
+import ctypes
+import ctypes.util
+from concurrent.futures import ThreadPoolExecutor
 
 # Define file type categories
 FILE_TYPES = {
@@ -9,85 +22,833 @@ FILE_TYPES = {
     'Documents': ['.pdf', '.doc', '.docx', '.txt', '.rtf', '.odt', '.xls', '.xlsx', '.ppt', '.pptx', '.csv'],
     'Audio': ['.mp3', '.wav', '.aac', '.flac', '.ogg', '.m4a'],
     'Video': ['.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv'],
-    'Archives': ['.zip', '.rar', '.7z', '.tar', '.gz'],
+    'Archives': ['.zip', '.rar', '.7z', '.tar', '.gz', '.tgz', '.tar.gz', '.tar.bz2', '.tar.xz', '.tar.zst'],
     'Code': ['.py', '.go', '.js', '.html', '.css', '.java', '.c', '.cpp', '.h', '.ts', '.json', '.xml'],
     'Executables': ['.exe', '.msi', '.dmg', '.app', '.deb', '.rpm']
 }
 
-def organize_directory(directory):
+OTHERS = 'Others'
+
+SCRIPT_PATH = os.path.abspath(__file__)
+
+# Moves applied and journaled together
+BATCH_SIZE = 1000
+
+# Parallel copies when moving across filesystems
+COPY_JOBS = 4
+
+# Journals live in the destination; files with this prefix are never organized
+JOURNAL_PREFIX = ".organizer-journal-"
+
+# Finished journals kept per destination for --rollback; older ones are deleted
+JOURNAL_KEEP = 10
+
+# Magic numbers for --sniff: (pattern, category, strong). '?' matches any byte.
+# Strong signatures override a known extension (photo.txt that is really a
+# JPEG); weak ones are containers or short codes shared by many formats
+# (.docx is a zip) and only classify files whose extension says nothing.
+SIGNATURES = [
+    (b'\xff\xd8\xff', 'Images', True),
+    (b'\x89PNG\r\n\x1a\n', 'Images', True),
+    (b'GIF87a', 'Images', True),
+    (b'GIF89a', 'Images', True),
+    (b'II*\x00', 'Images', True),
+    (b'MM\x00*', 'Images', True),
+    (b'RIFF????WEBP', 'Images', True),
+    (b'????ftypheic', 'Images', True),
+    (b'%PDF-', 'Documents', True),
+    (b'{\\rtf', 'Documents', True),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'Documents', False),
+    (b'ID3', 'Audio', True),
+    (b'fLaC', 'Audio', True),
+    (b'OggS', 'Audio', True),
+    (b'RIFF????WAVE', 'Audio', True),
+    (b'????ftypM4A ', 'Audio', True),
+    (b'\xff\xfb', 'Audio', False),
+    (b'\xff\xf3', 'Audio', False),
+    (b'\xff\xf1', 'Audio', False),
+    (b'????ftyp', 'Video', True),
+    (b'\x1aE\xdf\xa3', 'Video', True),
+    (b'RIFF????AVI ', 'Video', True),
+    (b'FLV\x01', 'Video', True),
+    (b'0&\xb2u\x8ef\xcf\x11', 'Video', True),
+    (b'PK\x03\x04', 'Archives', False),
+    (b'\x1f\x8b', 'Archives', True),
+    (b'7z\xbc\xaf\x27\x1c', 'Archives', True),
+    (b'Rar!\x1a\x07', 'Archives', True),
+    (b'BZh', 'Archives', True),
+    (b'\xfd7zXZ\x00', 'Archives', True),
+    (b'(\xb5/\xfd', 'Archives', True),
+    (b'?' * 257 + b'ustar', 'Archives', True),
+    (b'\x7fELF', 'Executables', True),
+    (b'MZ', 'Executables', False),
+    (b'\xcf\xfa\xed\xfe', 'Executables', True),
+    (b'\xce\xfa\xed\xfe', 'Executables', True),
+    (b'!<arch>\ndebian', 'Executables', True),
+    (b'\xed\xab\xee\xdb', 'Executables', True),
+    (b'#!', 'Code', False),
+    (b'<?xml', 'Code', False),
+]
+
+# Bytes read from the start of each file when sniffing
+SNIFF_BYTES = max(len(pattern) for pattern, _, _ in SIGNATURES)
+
+DEFAULT_CACHE = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+                             "organizer", "sniff.sqlite")
+
+# Files modified this recently may change again within the same mtime tick,
+# so their sniffed category is used but not cached
+RACY_WINDOW_NS = 2 * 10**9
+
+# Names downloaders give files they are still writing; the final rename is what we organize
+PARTIAL_SUFFIXES = ('.part', '.crdownload', '.partial')
+
+# inotify(7) event bits used by --watch
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+# renameat2(2) arguments: paths relative to the cwd, fail with EEXIST instead of replacing
+AT_FDCWD = -100
+RENAME_NOREPLACE = 1
+
+# --watch moves a file once it has not been written for this long (seconds)
+DEBOUNCE = 0.05
+
+# Extension -> category, built once; compound extensions like '.tar.gz' are keys too
+EXTENSION_INDEX = {ext: category for category, extensions in FILE_TYPES.items() for ext in extensions}
+MAX_EXTENSION_PARTS = max(ext.count('.') for ext in EXTENSION_INDEX)
+
+def classify(name):
+    """Return (category, extension) for a file name, preferring the longest known extension.
+
+    A leading dot does not start an extension, so '.bashrc' has none. The
+    extension returned is the one to keep when renaming on a collision.
+    """
+    lower = name.lower()
+    leading_dots = len(lower) - len(lower.lstrip('.'))
+    start = len(lower)
+    suffixes = []
+    for _ in range(MAX_EXTENSION_PARTS):
+        start = lower.rfind('.', 0, start)
+        if start <= 0 or start < leading_dots:
+            break
+        suffixes.append(start)
+    for start in reversed(suffixes):
+        category = EXTENSION_INDEX.get(lower[start:])
+        if category:
+            return category, name[start:]
+    return OTHERS, name[suffixes[0]:] if suffixes else ''
+
+class Destination:
+    """A category folder plus the names already in it, listed once.
+
+    Names are compared case-insensitively so that a collision is never
+    missed on case-insensitive filesystems.
+    """
+
+    def __init__(self, path, exists):
+        self.path = path
+        self.exists = exists
+        self.names = {name.casefold() for name in os.listdir(path)} if exists else set()
+
+    def taken(self, name, check=False):
+        if name.casefold() in self.names:
+            return True
+        return check and os.path.lexists(os.path.join(self.path, name))
+
+    def claim(self, name, extension, check=False):
+        """Reserve a free name for `name`, adding _1, _2, ... before the extension if needed.
+
+        With check, names are also tested on disk, for when the folder may
+        have changed since it was listed.
+        """
+        candidate = name
+        if self.taken(candidate, check):
+            base = name[:len(name) - len(extension)] if extension else name
+            counter = 1
+            while self.taken(candidate, check):
+                candidate = f"{base}_{counter}{extension}"
+                counter += 1
+        self.names.add(candidate.casefold())
+        return candidate
+
+# Trie keys: byte values 0-255, plus these two
+WILDCARD = 256
+MATCH = -1
+
+def compile_signatures(signatures):
+    """Build a prefix trie of nested dicts from (pattern, category, strong) entries.
+
+    A node's MATCH key holds (category, strong) for the pattern ending there.
+    A run of n wildcards is a single edge, node[WILDCARD][n], so the tar
+    signature at offset 257 costs one step rather than 257.
+    """
+    root = {}
+    for pattern, category, strong in signatures:
+        node = root
+        for run in re.finditer(rb'\?+|[^?]', pattern):
+            if run.group().startswith(b'?'):
+                node = node.setdefault(WILDCARD, {}).setdefault(len(run.group()), {})
+            else:
+                node = node.setdefault(run.group()[0], {})
+        node[MATCH] = (category, strong)
+    return root
+
+SIGNATURE_TRIE = compile_signatures(SIGNATURES)
+
+def match_signature(header, trie=SIGNATURE_TRIE):
+    """Return (category, strong) for the longest signature matching header, or None."""
+    best, best_depth = None, -1
+    stack = [(trie, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if MATCH in node and depth > best_depth:
+            best, best_depth = node[MATCH], depth
+        if depth < len(header):
+            child = node.get(header[depth])
+            if child is not None:
+                stack.append((child, depth + 1))
+            for skip, child in node.get(WILDCARD, {}).items():
+                if depth + skip < len(header):
+                    stack.append((child, depth + skip))
+    return best
+
+def sniff_file(path):
+    """Read the first SNIFF_BYTES of a file and match them; None if unknown or unreadable."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        return match_signature(os.read(fd, SNIFF_BYTES))
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+class SniffCache:
+    """SQLite store of sniff results keyed by (device, inode), valid while size and mtime_ns match.
+
+    Renames keep the inode, so results survive the files being organized.
+    The pragma user_version records SIGNATURES; editing the table drops the cache.
+    """
+
+    FLUSH_EVERY = 1000
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        version = zlib.crc32(repr(SIGNATURES).encode()) & 0x7fffffff
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != version:
+            self.db.execute("DROP TABLE IF EXISTS sniffed")
+            self.db.execute(f"PRAGMA user_version={version}")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS sniffed (
+                dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER,
+                category TEXT, strong INTEGER,
+                PRIMARY KEY (dev, ino))""")
+        self.pending = []
+        self.cutoff = time.time_ns() - RACY_WINDOW_NS
+
+    def get(self, st):
+        """Return (hit, result) for a stat result."""
+        row = self.db.execute(
+            "SELECT category, strong FROM sniffed WHERE dev=? AND ino=? AND size=? AND mtime_ns=?",
+            (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)).fetchone()
+        if row is None:
+            return False, None
+        return True, (row[0], bool(row[1])) if row[0] else None
+
+    def put(self, st, result):
+        if st.st_mtime_ns >= self.cutoff:
+            return
+        category, strong = result or ('', False)
+        self.pending.append((st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, category, strong))
+        if len(self.pending) >= self.FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO sniffed VALUES (?, ?, ?, ?, ?, ?)", self.pending)
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+def sniff_categories(entries, extension_categories, cache=None, jobs=COPY_JOBS):
+    """Return the category for each DirEntry, letting file contents override the extension.
+
+    Cached results are looked up on the calling thread; the rest are read
+    on a pool of `jobs` threads.
+    """
+    results = [None] * len(entries)
+    stats = [None] * len(entries)
+    misses = []
+    for i, entry in enumerate(entries):
+        if cache is not None:
+            try:
+                stats[i] = entry.stat()
+            except OSError:
+                continue
+            hit, results[i] = cache.get(stats[i])
+            if hit:
+                continue
+        misses.append(i)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for i, result in zip(misses, pool.map(sniff_file, [entries[i].path for i in misses])):
+            results[i] = result
+            if cache is not None:
+                cache.put(stats[i], result)
+
+    categories = []
+    for result, category in zip(results, extension_categories):
+        if result and (result[1] or category == OTHERS):
+            category = result[0]
+        categories.append(category)
+    return categories
+
+def iter_files(directory, recursive=False, skip_dirs=()):
+    """Yield a DirEntry for each file under directory, top level only unless recursive.
+
+    Directories whose absolute path is in skip_dirs are not descended into,
+    so already organized folders are left alone.
+    """
+    stack = [directory]
+    while stack:
+        top = stack.pop()
+        try:
+            with os.scandir(top) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        if recursive and not entry.is_symlink() and entry.path not in skip_dirs:
+                            stack.append(entry.path)
+                    else:
+                        yield entry
+        except OSError as e:
+            print(f"Error reading {top}: {e}")
+
+def plan_moves(directory, dest, recursive=False, sniff=False, cache=None, jobs=COPY_JOBS):
+    """Build the whole move plan in memory: a list of (source, destination) paths.
+
+    Destination names are reserved as the plan is built, so two files with
+    the same name get distinct targets before anything is moved. With sniff,
+    categories come from file contents where a signature matches.
+    """
+    skip_dirs = {os.path.join(dest, category) for category in list(FILE_TYPES) + [OTHERS]}
+    skip_dirs.add(dest)
+    entries = [entry for entry in iter_files(directory, recursive, skip_dirs) if not is_ignored(entry.path)]
+    return plan_entries(entries, dest, {}, sniff, cache, jobs)
+
+def is_ignored(path):
+    """True for this script, our own journals and unfinished downloads, which are never organized."""
+    name = os.path.basename(path)
+    return path == SCRIPT_PATH or name.startswith(JOURNAL_PREFIX) or name.endswith(PARTIAL_SUFFIXES)
+
+def plan_entries(entries, dest, destinations, sniff=False, cache=None, jobs=COPY_JOBS, check=False):
+    """Plan moves for DirEntry-like objects into the category folders under dest.
+
+    `destinations` maps category -> Destination and is filled in as folders
+    are first needed, so a caller can keep it between calls.
+    """
+    classified = [classify(entry.name) for entry in entries]
+    categories = [category for category, _ in classified]
+    if sniff:
+        categories = sniff_categories(entries, categories, cache, jobs)
+
+    plan = []
+    for entry, category, (_, extension) in zip(entries, categories, classified):
+        destination = destinations.get(category)
+        if destination is None:
+            path = os.path.join(dest, category)
+            destination = Destination(path, os.path.isdir(path))
+            destinations[category] = destination
+        plan.append((entry.path, os.path.join(destination.path, destination.claim(entry.name, extension, check))))
+    return plan
+
+def load_renameat2():
+    """Return libc's renameat2, or None where it does not exist (non-Linux, old glibc)."""
+    try:
+        renameat2 = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True).renameat2
+    except (OSError, AttributeError, TypeError):
+        return None
+    renameat2.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+    renameat2.restype = ctypes.c_int
+    return renameat2
+
+RENAMEAT2 = load_renameat2()
+
+def rename_noreplace(src, dst):
+    """Rename src to dst, raising FileExistsError rather than replacing dst.
+
+    Free names are picked from a listing made before the moves start, and a
+    file may have been created in a category folder since. renameat2 with
+    RENAME_NOREPLACE checks and renames atomically; where it is unsupported
+    dst is checked just before the rename.
+    """
+    if RENAMEAT2 is not None:
+        if RENAMEAT2(AT_FDCWD, os.fsencode(src), AT_FDCWD, os.fsencode(dst), RENAME_NOREPLACE) == 0:
+            return
+        err = ctypes.get_errno()
+        if err == errno.EEXIST:
+            raise FileExistsError(err, "Target already exists", dst)
+        if err not in (errno.EINVAL, errno.ENOSYS):
+            raise OSError(err, os.strerror(err), src, None, dst)
+    if os.path.lexists(dst):
+        raise FileExistsError(errno.EEXIST, "Target already exists", dst)
+    os.rename(src, dst)
+
+def copy_across(src, dst):
+    """Copy a file to another filesystem: write dst.part, fsync it, rename it into place.
+
+    The source is left for the caller to remove once the folder is synced.
+    """
+    tmp = dst + ".part"
+    try:
+        shutil.copy2(src, tmp)
+        fd = os.open(tmp, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        rename_noreplace(tmp, dst)
+    except BaseException:
+        if os.path.lexists(tmp):
+            os.unlink(tmp)
+        raise
+
+def fsync_dirs(paths):
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+def execute(moves, jobs=COPY_JOBS):
+    """Apply one batch of (src, dst) moves; returns (moved, errors).
+
+    Each move is tried as a plain rename first; those that fail with EXDEV
+    are copied across filesystems on a pool of `jobs` threads, and their
+    sources are removed only after the destination folders are fsynced.
+    No move replaces an existing file: it fails and the source stays put.
+    """
+    moved, errors, across = [], [], []
+    for src, dst in moves:
+        try:
+            rename_noreplace(src, dst)
+            moved.append((src, dst))
+        except OSError as e:
+            if e.errno == errno.EXDEV:
+                across.append((src, dst))
+            else:
+                errors.append((src, e))
+
+    if across:
+        copied = []
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = [(src, dst, pool.submit(copy_across, src, dst)) for src, dst in across]
+            for src, dst, future in futures:
+                try:
+                    future.result()
+                    copied.append((src, dst))
+                except OSError as e:
+                    errors.append((src, e))
+        fsync_dirs({os.path.dirname(dst) for _, dst in copied})
+        for src, dst in copied:
+            try:
+                os.unlink(src)
+                moved.append((src, dst))
+            except OSError as e:
+                errors.append((src, e))
+
+    return moved, errors
+
+class Journal:
+    """Compact write-ahead log of a run.
+
+    The first line holds the source and destination roots; then every batch
+    is logged as {"b": n, "m": [[src, dst], ...]} with paths relative to
+    those roots and fsynced before it runs, and {"d": n} once it is done.
+    "d" lines are not fsynced: a batch that lost its "d" in a crash is just
+    checked again on resume, which is harmless.
+    """
+
+    def __init__(self, path, source, dest, recursive, sniff):
+        self.file = open(path, 'a')
+        # Planned paths all sit under the roots; slicing beats os.path.relpath per path
+        self.source_prefix = len(os.path.join(source, ''))
+        self.dest_prefix = len(os.path.join(dest, ''))
+        self.batches = 0
+        self.write({"source": source, "dest": dest, "recursive": recursive, "sniff": sniff})
+
+    def write(self, record, sync=True):
+        self.file.write(json.dumps(record, separators=(',', ':')) + "\n")
+        self.file.flush()
+        if sync:
+            os.fsync(self.file.fileno())
+
+    def begin(self, moves):
+        """Log a batch before it runs and return its number."""
+        number = self.batches
+        self.batches += 1
+        self.write({"b": number, "m": [[src[self.source_prefix:], dst[self.dest_prefix:]] for src, dst in moves]})
+        return number
+
+    def commit(self, number):
+        self.write({"d": number}, sync=False)
+
+    def close(self):
+        self.file.close()
+
+def read_journal(path):
+    """Return (header, [(batch number, [(src, dst), ...], completed)]) with absolute paths."""
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    header = records[0]
+    done = {record["d"] for record in records if "d" in record}
+    batches = [(record["b"], [(os.path.join(header["source"], src), os.path.join(header["dest"], dst))
+                              for src, dst in record["m"]], record["b"] in done)
+               for record in records if "b" in record]
+    return header, batches
+
+def prune_journals(dest, keep=JOURNAL_KEEP):
+    """Delete all but the newest `keep` finished journals in dest.
+
+    Journals with a batch that never completed are left for --resume.
+    """
+    try:
+        names = sorted(name for name in os.listdir(dest)
+                       if name.startswith(JOURNAL_PREFIX) and name.endswith(".jsonl"))
+    except OSError:
+        return
+    for name in names[:max(0, len(names) - keep)]:
+        path = os.path.join(dest, name)
+        try:
+            _, batches = read_journal(path)
+            if all(completed for _, _, completed in batches):
+                os.unlink(path)
+        except (OSError, ValueError, IndexError, KeyError):
+            continue
+
+def apply_plan(plan, journal=None, jobs=COPY_JOBS, quiet=False):
+    """Apply a plan in batches of BATCH_SIZE, journaling each batch; returns the number moved."""
+    for folder in {os.path.dirname(dst) for _, dst in plan}:
+        os.makedirs(folder, exist_ok=True)
+
+    moved_count = 0
+    for start in range(0, len(plan), BATCH_SIZE):
+        batch = plan[start:start + BATCH_SIZE]
+        if journal:
+            number = journal.begin(batch)
+        moved, errors = execute(batch, jobs)
+        if journal:
+            journal.commit(number)
+        moved_count += len(moved)
+
+        # One write per batch; a print per file dominates large runs
+        lines = [] if quiet else [f"Moved: {os.path.basename(src)} -> {os.path.basename(os.path.dirname(dst))}/"
+                                  for src, dst in moved]
+        lines += [f"Error moving {os.path.basename(src)}: {e}" for src, e in errors]
+        if lines:
+            sys.stdout.write("\n".join(lines) + "\n")
+    return moved_count
+
+def organize_directory(directory, dest=None, recursive=False, journal=True, jobs=COPY_JOBS, quiet=False,
+                       sniff=False, cache_path=DEFAULT_CACHE, keep_journals=JOURNAL_KEEP):
     directory = os.path.abspath(directory)
     if not os.path.exists(directory):
         print(f"Error: Directory '{directory}' does not exist.")
         return
+    dest = os.path.abspath(dest) if dest else directory
 
-    print(f"Organizing directory: {directory}")
+    print(f"Organizing directory: {directory}" + (f" into {dest}" if dest != directory else ""))
+    start = time.perf_counter()
 
-    # Create subdirectories if they don't exist
-    for category in FILE_TYPES.keys():
-        category_path = os.path.join(directory, category)
-        if not os.path.exists(category_path):
-            # We delay creation until we actually need to move a file to avoid empty folders
-            pass
+    cache = None
+    if sniff and cache_path:
+        try:
+            cache = SniffCache(cache_path)
+        except sqlite3.Error as e:
+            print(f"Error: Cannot open sniff cache '{cache_path}': {e}")
+    try:
+        plan = plan_moves(directory, dest, recursive, sniff, cache, jobs)
+    finally:
+        if cache:
+            cache.close()
+    if not plan:
+        print("Done. Organized 0 files.")
+        if journal:
+            prune_journals(dest, keep_journals)
+        return
 
-    items = os.listdir(directory)
-    moved_count = 0
+    os.makedirs(dest, exist_ok=True)
+    journal_path = None
+    if journal:
+        journal_path = os.path.join(dest, f"{JOURNAL_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}.jsonl")
+        journal = Journal(journal_path, directory, dest, recursive, sniff)
+    try:
+        moved_count = apply_plan(plan, journal or None, jobs, quiet)
+    finally:
+        if journal:
+            journal.close()
 
-    for item in items:
-        item_path = os.path.join(directory, item)
+    print(f"Done. Organized {moved_count} files in {time.perf_counter() - start:.2f}s.")
+    if journal_path:
+        prune_journals(dest, keep_journals)
+        if os.path.exists(journal_path):
+            print(f"Journal: {journal_path} (undo with --rollback)")
 
-        # Skip directories
-        if os.path.isdir(item_path):
-            continue
+def resume(journal_path, jobs=COPY_JOBS, quiet=False, cache_path=DEFAULT_CACHE, keep_journals=JOURNAL_KEEP):
+    """Finish an interrupted run: settle its last batch, then organize what is left."""
+    try:
+        header, batches = read_journal(journal_path)
+    except (OSError, ValueError, IndexError, KeyError) as e:
+        print(f"Error: Cannot read journal '{journal_path}': {e}")
+        return
 
-        # Skip this script if it's in the folder
-        if item == os.path.basename(__file__):
+    for number, moves, completed in batches:
+        if completed:
             continue
+        pending = []
+        conflicts = 0
+        for src, dst in moves:
+            if os.path.lexists(src) and os.path.lexists(dst):
+                # A finished cross-device copy whose source was not removed yet,
+                # or a different file that took the name: only drop an exact copy
+                try:
+                    same = filecmp.cmp(src, dst, shallow=False)
+                except OSError:
+                    same = False
+                if same:
+                    os.unlink(src)
+                else:
+                    conflicts += 1
+                    print(f"Conflict: {src} and {dst} both exist with different contents; keeping both.")
+            elif os.path.lexists(src):
+                if os.path.lexists(dst + ".part"):
+                    os.unlink(dst + ".part")
+                pending.append((src, dst))
+        moved, errors = execute(pending, jobs)
+        for src, e in errors:
+            print(f"Error moving {os.path.basename(src)}: {e}")
+        if not errors and not conflicts:
+            # Settled: the journal is finished again and can be pruned
+            with open(journal_path, "a") as f:
+                f.write(json.dumps({"d": number}, separators=(',', ':')) + "\n")
+        print(f"Recovered interrupted batch {number} ({len(moved)} moves redone, {conflicts} conflicts).")
 
-        _, extension = os.path.splitext(item)
-        extension = extension.lower()
-
-        destination_category = None
-        for category, extensions in FILE_TYPES.items():
-            if extension in extensions:
-                destination_category = category
-                break
-        
-        # If no category found, maybe skip or put in 'Others'
-        # For this script, we'll skip unknown types or put in 'Others'
-        if not destination_category:
-            destination_category = 'Others'
-
-        destination_folder = os.path.join(directory, destination_category)
-        if not os.path.exists(destination_folder):
-            os.makedirs(destination_folder)
-
-        destination_path = os.path.join(destination_folder, item)
-
-        # Handle duplicate filenames in destination
-        if os.path.exists(destination_path):
-            base, ext = os.path.splitext(item)
-            counter = 1
-            while os.path.exists(destination_path):
-                new_name = f"{base}_{counter}{ext}"
-                destination_path = os.path.join(destination_folder, new_name)
-                counter += 1
-        
+    organize_directory(header["source"], header["dest"], header.get("recursive") or False, True, jobs, quiet,
+                       header.get("sniff") or False, cache_path, keep_journals)
+
+def rollback(journal_path, jobs=COPY_JOBS):
+    """Move every journaled file back to where it came from, newest first."""
+    try:
+        header, batches = read_journal(journal_path)
+    except (OSError, ValueError, IndexError, KeyError) as e:
+        print(f"Error: Cannot read journal '{journal_path}': {e}")
+        return
+
+    reverse = [(dst, src) for _, moves, _ in reversed(batches) for src, dst in reversed(moves)
+               if os.path.lexists(dst) and not os.path.lexists(src)]
+    for folder in {os.path.dirname(src) for _, src in reverse}:
+        os.makedirs(folder, exist_ok=True)
+
+    restored = 0
+    for start in range(0, len(reverse), BATCH_SIZE):
+        moved, errors = execute(reverse[start:start + BATCH_SIZE], jobs)
+        restored += len(moved)
+        for src, e in errors:
+            print(f"Error restoring {src}: {e}")
+    print(f"Rolled back {restored} files.")
+
+class PathEntry:
+    """Stands in for os.DirEntry when a file is known by path rather than from scandir."""
+
+    __slots__ = ("path", "name", "st")
+
+    def __init__(self, path, st):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.st = st
+
+    def stat(self):
+        return self.st
+
+class Inotify:
+    """Minimal inotify(7) binding through ctypes: a non-blocking fd and its events."""
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+
+    def add_watch(self, path, mask):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()), path)
+        return wd
+
+    def read(self):
+        """Return the queued events as (mask, name) pairs."""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            events.append((mask, os.fsdecode(data[offset:offset + length].rstrip(b'\0'))))
+            offset += length
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+def watch_directory(directory, dest=None, journal=True, jobs=COPY_JOBS, quiet=False,
+                    sniff=False, cache_path=DEFAULT_CACHE, debounce=DEBOUNCE):
+    """Organize files as they arrive in directory, until interrupted.
+
+    Files are picked up when closed after writing (IN_CLOSE_WRITE) or moved
+    in (IN_MOVED_TO), and moved once they have not been modified for
+    `debounce` seconds. Between events the process sleeps in select(), so
+    an idle watcher uses no CPU.
+    """
+    directory = os.path.abspath(directory)
+    if not os.path.exists(directory):
+        print(f"Error: Directory '{directory}' does not exist.")
+        return
+    dest = os.path.abspath(dest) if dest else directory
+
+    try:
+        inotify = Inotify()
+        inotify.add_watch(directory, IN_CLOSE_WRITE | IN_MOVED_TO)
+    except (OSError, AttributeError) as e:
+        print(f"Error: Cannot watch '{directory}' (needs Linux inotify): {e}")
+        return
+
+    # Watch first, then sweep, so nothing arriving in between is missed
+    organize_directory(directory, dest, False, journal, jobs, quiet, sniff, cache_path)
+
+    cache = None
+    if sniff and cache_path:
         try:
-            shutil.move(item_path, destination_path)
-            print(f"Moved: {item} -> {destination_category}/")
-            moved_count += 1
-        except Exception as e:
-            print(f"Error moving {item}: {e}")
+            cache = SniffCache(cache_path)
+        except sqlite3.Error as e:
+            print(f"Error: Cannot open sniff cache '{cache_path}': {e}")
+    session = None
+    destinations = {}
+    pending = {}
+    moved_count = 0
+    selector = selectors.DefaultSelector()
+    selector.register(inotify.fd, selectors.EVENT_READ)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"Watching {directory} (Ctrl+C to stop)")
+
+    try:
+        while True:
+            timeout = max(0, min(pending.values()) - time.monotonic()) if pending else None
+            if selector.select(timeout):
+                for mask, name in inotify.read():
+                    if mask & IN_Q_OVERFLOW:
+                        # Events were lost; fall back to one full pass
+                        organize_directory(directory, dest, False, journal, jobs, quiet, sniff, cache_path)
+                        destinations.clear()
+                    elif name and not mask & IN_ISDIR and not is_ignored(os.path.join(directory, name)):
+                        pending[name] = time.monotonic() + debounce
 
-    print(f"Done. Organized {moved_count} files.")
+            now = time.monotonic()
+            entries = []
+            for name in [name for name, deadline in pending.items() if deadline <= now]:
+                del pending[name]
+                path = os.path.join(directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                # Reopened and written since it was closed: wait until it settles
+                quiet_for = (time.time_ns() - st.st_mtime_ns) / 1e9
+                if quiet_for < debounce:
+                    pending[name] = now + debounce - quiet_for
+                    continue
+                entries.append(PathEntry(path, st))
+            if not entries:
+                continue
+
+            # Other programs may have added files to the folders since we listed them
+            plan = plan_entries(entries, dest, destinations, sniff, cache, jobs, check=True)
+            if journal and session is None:
+                session = Journal(os.path.join(dest, f"{JOURNAL_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}-watch.jsonl"),
+                                  directory, dest, False, sniff)
+            moved_count += apply_plan(plan, session, jobs, quiet)
+            if cache:
+                cache.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        selector.close()
+        inotify.close()
+        if cache:
+            cache.close()
+        if session:
+            session.close()
+        print(f"Stopped. Organized {moved_count} files while watching.")
+        if session:
+            print(f"Journal: {session.file.name} (undo with --rollback)")
 
 def main():
     parser = argparse.ArgumentParser(description="Organize files in a directory by type.")
     parser.add_argument("directory", nargs="?", default=".", help="The directory to organize (default: current directory)")
-    
+    parser.add_argument("--dest", help="Put the category folders here instead of in the directory itself")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="Also organize files in subdirectories (category folders are left alone)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only print errors and the summary")
+    parser.add_argument("--sniff", action="store_true",
+                        help="Classify by file contents (magic bytes) where they are recognized")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help=f"Sniff result cache file (default: {DEFAULT_CACHE})")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the sniff cache")
+    parser.add_argument("--jobs", type=int, default=COPY_JOBS,
+                        help=f"Threads for sniffing and for copies across filesystems (default: {COPY_JOBS})")
+    parser.add_argument("--no-journal", action="store_true", help="Do not write a journal")
+    parser.add_argument("--keep-journals", type=int, default=JOURNAL_KEEP, metavar="N",
+                        help=f"Finished journals to keep in the destination; older ones are deleted (default: {JOURNAL_KEEP})")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and organize new files as they arrive (Linux only)")
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE * 1000, metavar="MS",
+                        help=f"With --watch, wait until a file has not been written for this long (default: {DEBOUNCE * 1000:g})")
+    parser.add_argument("--resume", metavar="JOURNAL", help="Finish a run that was interrupted")
+    parser.add_argument("--rollback", metavar="JOURNAL", help="Undo the moves recorded in a journal")
+
     args = parser.parse_args()
-    
-    organize_directory(args.directory)
+    jobs = max(1, args.jobs)
+    cache_path = None if args.no_cache else args.cache
+
+    if args.rollback:
+        rollback(args.rollback, jobs)
+    elif args.watch:
+        if args.recursive:
+            parser.error("--watch only watches the directory itself, not --recursive")
+        watch_directory(args.directory, args.dest, not args.no_journal, jobs, args.quiet,
+                        args.sniff, cache_path, max(0, args.debounce) / 1000)
+    elif args.resume:
+        resume(args.resume, jobs, args.quiet, cache_path, max(0, args.keep_journals))
+    else:
+        organize_directory(args.directory, args.dest, args.recursive, not args.no_journal, jobs, args.quiet,
+                           args.sniff, cache_path, max(0, args.keep_journals))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,141 @@
+"""Regression checks for organizing, resuming and rolling back a run.
+
+Run with `python3 -m unittest test_organizer` from this directory.
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import contextlib
+
+import organizer
+
+
+def quietly(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        fn(*args, **kwargs)
+    return out.getvalue()
+
+
+class OrganizerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = os.path.join(os.path.realpath(self.tmp.name), "inbox")
+        os.makedirs(self.source)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make(self, name, data=None, root=None):
+        path = os.path.join(root or self.source, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(name if data is None else data)
+        return path
+
+    def tree(self, root=None):
+        """Map each file's path relative to root to its contents, journals excluded."""
+        root = root or self.source
+        result = {}
+        for directory, _, names in os.walk(root):
+            for name in names:
+                if name.startswith(organizer.JOURNAL_PREFIX):
+                    continue
+                path = os.path.join(directory, name)
+                with open(path) as f:
+                    result[os.path.relpath(path, root)] = f.read()
+        return result
+
+    def journals(self, root=None):
+        root = root or self.source
+        return sorted(os.path.join(root, name) for name in os.listdir(root)
+                      if name.startswith(organizer.JOURNAL_PREFIX))
+
+    def test_organize_and_rollback_round_trip(self):
+        for name in ("a.jpg", "b.pdf", "c.tar.gz", "d.unknown", "e.jpg"):
+            self.make(name)
+        # Already taken in the category folder: the new one must get a free name
+        self.make("Images/e.jpg", "old")
+        before = self.tree()
+
+        quietly(organizer.organize_directory, self.source, cache_path=None)
+        self.assertEqual(self.tree(), {
+            "Images/a.jpg": "a.jpg", "Images/e.jpg": "old", "Images/e_1.jpg": "e.jpg",
+            "Documents/b.pdf": "b.pdf", "Archives/c.tar.gz": "c.tar.gz", "Others/d.unknown": "d.unknown",
+        })
+
+        journal, = self.journals()
+        quietly(organizer.rollback, journal)
+        self.assertEqual(self.tree(), before)
+
+    def test_rollback_across_filesystems(self):
+        dest = tempfile.mkdtemp(dir="/dev/shm") if os.path.isdir("/dev/shm") else None
+        if dest is None or os.stat(dest).st_dev == os.stat(self.source).st_dev:
+            self.skipTest("needs /dev/shm on a different filesystem")
+        self.addCleanup(shutil.rmtree, dest, ignore_errors=True)
+        for name in ("a.jpg", "b.txt"):
+            self.make(name)
+
+        quietly(organizer.organize_directory, self.source, dest, cache_path=None)
+        self.assertEqual(self.tree(), {})
+        self.assertEqual(self.tree(dest), {"Images/a.jpg": "a.jpg", "Documents/b.txt": "b.txt"})
+        self.assertEqual([name for _, _, names in os.walk(dest) for name in names if name.endswith(".part")], [])
+
+        journal, = self.journals(dest)
+        quietly(organizer.rollback, journal)
+        self.assertEqual(self.tree(), {"a.jpg": "a.jpg", "b.txt": "b.txt"})
+
+    def test_resume_interrupted_batch(self):
+        moved = self.make("moved.jpg")
+        copied = self.make("copied.jpg")
+        conflict = self.make("conflict.jpg", "mine")
+        pending = self.make("pending.jpg")
+        later = self.make("later.txt")
+        plan = [(path, os.path.join(self.source, "Images", os.path.basename(path)))
+                for path in (moved, copied, conflict, pending)]
+
+        # Crash in the middle of the batch: one rename done, one cross-device
+        # copy landed without its source removed, and one name taken by a
+        # different file of the same size
+        journal_path = os.path.join(self.source, organizer.JOURNAL_PREFIX + "20000101-000000.jsonl")
+        journal = organizer.Journal(journal_path, self.source, self.source, False, False)
+        journal.begin(plan)
+        journal.close()
+        os.makedirs(os.path.join(self.source, "Images"))
+        os.rename(moved, plan[0][1])
+        self.make("Images/copied.jpg", "copied.jpg")
+        self.make("Images/conflict.jpg", "MINE")
+
+        out = quietly(organizer.resume, journal_path, cache_path=None)
+        self.assertIn("Conflict:", out)
+        self.assertEqual(self.tree(), {
+            "Images/moved.jpg": "moved.jpg", "Images/copied.jpg": "copied.jpg",
+            "Images/conflict.jpg": "MINE", "Images/conflict_1.jpg": "mine",
+            "Images/pending.jpg": "pending.jpg", "Documents/later.txt": "later.txt",
+        })
+        self.assertFalse(os.path.exists(later))
+
+        # The conflict kept the batch unfinished, so the journal is never pruned
+        quietly(organizer.organize_directory, self.source, cache_path=None, keep_journals=0)
+        self.assertIn(journal_path, self.journals())
+
+    def test_finished_journals_are_pruned(self):
+        names = [f"{organizer.JOURNAL_PREFIX}2000010{i}-000000.jsonl" for i in range(1, 5)]
+        for name in names:
+            journal = organizer.Journal(os.path.join(self.source, name), self.source, self.source, False, False)
+            journal.commit(journal.begin([]))
+            journal.close()
+        self.make("a.jpg")
+
+        quietly(organizer.organize_directory, self.source, cache_path=None, keep_journals=2)
+        kept = [os.path.basename(path) for path in self.journals()]
+        self.assertEqual(len(kept), 2)
+        self.assertEqual(kept[0], names[-1])
+        self.assertNotIn(names[0], kept)
+
+
+if __name__ == "__main__":
+    unittest.main()
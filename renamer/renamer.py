@@ -8,57 +8,409 @@ Safety: Defaults to DRY RUN mode. Use --commit to apply changes.
 
 import os
 import re
-import argparse
 import sys
+import json
+import time
+import errno
+import ctypes
+import ctypes.util
+import argparse
+import itertools
+
+# Renames applied and journaled together
+BATCH_SIZE = 10000
+
+# Journals are written to the target directory and never renamed themselves
+JOURNAL_PREFIX = ".renamer-journal-"
+
+# Cycles (a -> b, b -> a) are broken by parking one file under a name like this
+TEMP_PREFIX = ".renamer-tmp-"
+
+# renameat2(2) flag: fail with EEXIST instead of replacing the target
+RENAME_NOREPLACE = 1
+
+def load_renameat2():
+    """Return libc's renameat2, or None where it does not exist (non-Linux, old glibc)."""
+    try:
+        renameat2 = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True).renameat2
+    except (OSError, AttributeError, TypeError):
+        return None
+    renameat2.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+    renameat2.restype = ctypes.c_int
+    return renameat2
+
+RENAMEAT2 = load_renameat2()
+
+def rename_noreplace(old, new, dir_fd):
+    """Rename old to new inside dir_fd; raises FileExistsError rather than replacing new.
+
+    Uses renameat2(RENAME_NOREPLACE), which checks and renames atomically.
+    Where that is unavailable the target is checked just before renaming.
+    """
+    if RENAMEAT2 is not None:
+        if RENAMEAT2(dir_fd, os.fsencode(old), dir_fd, os.fsencode(new), RENAME_NOREPLACE) == 0:
+            return
+        err = ctypes.get_errno()
+        # EINVAL/ENOSYS: the kernel or filesystem does not support the flag
+        if err not in (errno.EINVAL, errno.ENOSYS):
+            raise OSError(err, os.strerror(err), old, None, new)
+    try:
+        os.stat(new, dir_fd=dir_fd, follow_symlinks=False)
+    except FileNotFoundError:
+        os.rename(old, new, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+        return
+    raise FileExistsError(errno.EEXIST, "Target already exists", new)
+
+def make_renamer(search, replace, regex=False, ignore_case=False):
+    """Return a function mapping a file name to its new name.
+
+    Patterns are compiled once; raises re.error for a bad regex.
+    """
+    if regex or ignore_case:
+        # Case insensitive literal replace is a bit tricky in Python without regex
+        # We'll use regex for it anyway but escape the search string
+        pattern = re.compile(search if regex else re.escape(search), re.IGNORECASE if ignore_case else 0)
+        return lambda name: pattern.sub(replace, name)
+    return lambda name: name.replace(search, replace)
+
+def scan(path, recursive=False, hidden=False):
+    """Yield (directory, file names, all names) for path and, if recursive, every subdirectory.
+
+    Uses os.scandir, whose entries already know their type, so files are
+    told apart from directories without a stat call per entry. Directories
+    and files come out in sorted order.
+    """
+    stack = [path]
+    while stack:
+        directory = stack.pop()
+        files, names, subdirs = [], set(), []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    names.add(entry.name)
+                    if not hidden and entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            subdirs.append(entry.path)
+                    elif entry.is_file() and not entry.name.startswith(JOURNAL_PREFIX):
+                        files.append(entry.name)
+        except OSError as e:
+            print(f"[!] Error reading '{directory}': {e}")
+            continue
+        stack.extend(sorted(subdirs, reverse=True))
+        files.sort()
+        yield directory, files, names
+
+def resolve(moves, names):
+    """Drop renames that cannot happen; returns (moves, skipped).
+
+    A rename is dropped when a file that stays put already has the new name,
+    or when an earlier file (in sorted order) claimed the same new name.
+    Dropping one can block another (a -> b when b's own rename was dropped),
+    so blocked sources are followed back through the chain.
+    """
+    skipped = []
+    targets = {}
+    for old in sorted(moves):
+        new = moves[old]
+        if new in targets:
+            skipped.append((old, new, "Another file is being renamed to the same name"))
+        else:
+            targets[new] = old
+    moves = {old: new for new, old in targets.items()}
+
+    blocked = [old for old, new in moves.items() if new in names and new not in moves]
+    while blocked:
+        old = blocked.pop()
+        new = moves.pop(old)
+        skipped.append((old, new, "Target already exists"))
+        # old now stays where it is, so whoever wanted its name is blocked too
+        source = targets.get(old)
+        if source in moves:
+            blocked.append(source)
+    return moves, skipped
+
+def order_moves(moves, names, groups=None):
+    """Order renames so that none lands on a name that has yet to move away.
+
+    moves maps old -> new with distinct targets, so the renames form simple
+    chains and cycles. Chains are applied from their far end; each cycle is
+    opened by parking one file under a temporary name. Returns a list of
+    (old, new, group) steps and the number of cycles. group is None for a
+    rename that stands alone, else (id, is_cycle) with ids drawn from the
+    `groups` counter, so that a failed step can stop the rest of its chain.
+    """
+    if not any(new in moves for new in moves.values()):
+        return [(old, new, None) for old, new in moves.items()], 0
+    if groups is None:
+        groups = itertools.count()
+
+    steps = []
+    done = set()
+    cycles = 0
+    for start in moves:
+        if start in done:
+            continue
+        path = [start]
+        node = moves[start]
+        while node in moves and node not in done and node != start:
+            path.append(node)
+            node = moves[node]
+        done.update(path)
+
+        if node == start:
+            cycles += 1
+            group = (next(groups), True)
+            temp = f"{TEMP_PREFIX}{os.getpid()}-{cycles}"
+            while temp in names:
+                temp += "_"
+            steps.append((start, temp, group))
+            steps.extend((old, moves[old], group) for old in reversed(path[1:]))
+            steps.append((temp, moves[start], group))
+        else:
+            group = (next(groups), False) if len(path) > 1 else None
+            steps.extend((old, moves[old], group) for old in reversed(path))
+    return steps, cycles
+
+def plan_renames(path, rename, recursive=False, hidden=False):
+    """Plan every rename under path.
+
+    Returns (changes, steps, skipped, cycles): the renames to show the user
+    as (old path relative to path, new name), the ordered (directory, old,
+    new, group) steps that carry them out, and the renames that were dropped
+    as (old path, new name, reason).
+    """
+    changes, steps, skipped = [], [], []
+    cycles = 0
+    groups = itertools.count()
+    for directory, files, names in scan(path, recursive, hidden):
+        relative = os.path.relpath(directory, path)
+        prefix = "" if relative == "." else relative + os.sep
+        moves = {}
+        for name in files:
+            new = rename(name)
+            if new == name:
+                continue
+            if not new or os.sep in new or new in ('.', '..'):
+                skipped.append((prefix + name, new, "Not a valid file name"))
+                continue
+            moves[name] = new
+        if not moves:
+            continue
+
+        moves, dropped = resolve(moves, names)
+        skipped.extend((prefix + old, new, reason) for old, new, reason in dropped)
+        ordered, found = order_moves(moves, names, groups)
+        cycles += found
+        changes.extend((prefix + old, new) for old, new in moves.items())
+        steps.extend((directory, old, new, group) for old, new, group in ordered)
+    return changes, steps, skipped, cycles
+
+class Journal:
+    """Write-ahead log of renames.
+
+    The first line holds the root directory. Each batch of steps is logged as
+    {"b": n, "s": [[directory, old, new], ...]}, with directories relative to
+    the root, and fsynced before any of them runs. {"d": n} follows once the
+    batch is done, with "n": [indexes] listing steps that did not take effect
+    (failed, skipped, or undone with their cycle). Rolling back replays the
+    logged steps in reverse, so a crash at any point can be undone.
+    """
+
+    def __init__(self, path, root):
+        self.file = open(path, 'a')
+        self.root = root
+        self.batches = 0
+        self.write({"root": root})
+
+    def write(self, record, sync=True):
+        self.file.write(json.dumps(record, separators=(',', ':')) + "\n")
+        self.file.flush()
+        if sync:
+            os.fsync(self.file.fileno())
+
+    def begin(self, steps):
+        number = self.batches
+        self.batches += 1
+        relative = {}
+        records = []
+        for directory, old, new, _ in steps:
+            if directory not in relative:
+                relative[directory] = os.path.relpath(directory, self.root)
+            records.append([relative[directory], old, new])
+        self.write({"b": number, "s": records})
+        return number
+
+    def commit(self, number, not_applied=()):
+        # Rollback checks every step on disk, so this line needs no fsync
+        record = {"d": number}
+        if not_applied:
+            record["n"] = list(not_applied)
+        self.write(record, sync=False)
+
+    def close(self):
+        self.file.close()
+
+def open_dir(directory, previous=None):
+    """Close the previous directory fd and open directory; None (after a message) if it cannot be opened."""
+    if previous is not None:
+        os.close(previous)
+    try:
+        return os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    except OSError as e:
+        print(f"[!] Error opening '{directory}': {e}")
+        return None
+
+def batches(steps):
+    """Split steps into runs of about BATCH_SIZE, never splitting a chain or cycle."""
+    start = 0
+    while start < len(steps):
+        end = min(start + BATCH_SIZE, len(steps))
+        while end < len(steps) and steps[end][3] is not None and steps[end][3] == steps[end - 1][3]:
+            end += 1
+        yield steps[start:end]
+        start = end
+
+def apply_steps(steps, journal=None):
+    """Rename in batches, journaling each batch first; returns (renamed, errors).
+
+    Renames are relative to an fd of their directory, so the kernel does not
+    walk the full path twice for every file, and never replace an existing
+    file: the plan was made before the confirmation prompt, and anything
+    may have appeared since. When a step fails, the rest of its chain is
+    skipped, and a cycle is unwound so no file is left under a temporary name.
+    """
+    renamed = errors = 0
+    current, dir_fd = None, None
+    try:
+        for batch in batches(steps):
+            if journal:
+                number = journal.begin(batch)
+            not_applied = []
+            group, failed, applied = None, False, []
+            for i, (directory, old, new, step_group) in enumerate(batch):
+                if step_group is None or step_group != group:
+                    group, failed, applied = step_group, False, []
+                if failed:
+                    print(f"[!] Warning: Skipping '{old}' -> '{new}' (An earlier rename in its chain failed)")
+                    not_applied.append(i)
+                    continue
+                if directory != current:
+                    current, dir_fd = directory, open_dir(directory, dir_fd)
+                try:
+                    if dir_fd is None:
+                        raise OSError(errno.EBADF, "Directory could not be opened", directory)
+                    rename_noreplace(old, new, dir_fd)
+                    renamed += 1
+                    applied.append(i)
+                    continue
+                except FileExistsError:
+                    print(f"[!] Warning: Skipping '{old}' -> '{new}' (Target already exists)")
+                except OSError as e:
+                    print(f"[!] Error renaming '{old}': {e}")
+                errors += 1
+                not_applied.append(i)
+                failed = step_group is not None
+                if failed and step_group[1]:
+                    renamed -= unwind(batch, applied, dir_fd, not_applied)
+            if journal:
+                journal.commit(number, sorted(not_applied))
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
+    return renamed, errors
+
+def unwind(batch, applied, dir_fd, not_applied):
+    """Undo the applied steps of a broken cycle, newest first; returns how many were undone."""
+    undone = 0
+    for i in reversed(applied):
+        _, old, new, _ = batch[i]
+        try:
+            rename_noreplace(new, old, dir_fd)
+        except OSError as e:
+            print(f"[!] Error undoing '{old}' -> '{new}': {e}")
+            continue
+        undone += 1
+        not_applied.append(i)
+    return undone
+
+def rollback(journal_path):
+    """Undo the renames recorded in a journal, newest first."""
+    try:
+        with open(journal_path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        root = records[0]["root"]
+    except (OSError, ValueError, IndexError, KeyError) as e:
+        print(f"Error: Cannot read journal '{journal_path}': {e}")
+        sys.exit(1)
+
+    # Steps a finished batch reports as not applied must not be reversed
+    not_applied = {record["d"]: set(record.get("n", ())) for record in records if "d" in record}
+    restored = 0
+    current, dir_fd = None, None
+    try:
+        for record in reversed(records):
+            skip = not_applied.get(record.get("b"), ())
+            steps = record.get("s", [])
+            for i in reversed(range(len(steps))):
+                if i in skip:
+                    continue
+                directory, old, new = steps[i]
+                if directory != current:
+                    current, dir_fd = directory, open_dir(os.path.join(root, directory), dir_fd)
+                if dir_fd is None:
+                    continue
+                try:
+                    # Never overwrite: the old name must be free again
+                    rename_noreplace(new, old, dir_fd)
+                    restored += 1
+                except (FileNotFoundError, FileExistsError):
+                    # The step never ran, was already undone, or its old name is taken
+                    pass
+                except OSError as e:
+                    print(f"[!] Error restoring '{old}': {e}")
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
+    print(f"Rolled back {restored} renames.")
 
 def main():
     parser = argparse.ArgumentParser(description="Bulk rename files in a directory.")
-    parser.add_argument("search", help="The string or regex pattern to look for")
-    parser.add_argument("replace", help="The replacement string")
+    parser.add_argument("search", nargs="?", help="The string or regex pattern to look for")
+    parser.add_argument("replace", nargs="?", help="The replacement string")
     parser.add_argument("path", nargs="?", default=".", help="Directory to process (default: current)")
     parser.add_argument("-r", "--regex", action="store_true", help="Treat search pattern as a Regular Expression")
     parser.add_argument("-c", "--commit", action="store_true", help="Actually rename the files (omitting this runs in DRY RUN mode)")
     parser.add_argument("-i", "--ignore-case", action="store_true", help="Ignore case during search")
     parser.add_argument("--hidden", action="store_true", help="Include hidden files (starting with .)")
+    parser.add_argument("-R", "--recursive", action="store_true", help="Also rename files in subdirectories")
+    parser.add_argument("-y", "--yes", action="store_true", help="Do not ask for confirmation with --commit")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Do not list every rename")
+    parser.add_argument("--journal", help="Where to write the journal (default: a .renamer-journal-* file in the directory)")
+    parser.add_argument("--rollback", metavar="JOURNAL", help="Undo the renames recorded in a journal")
 
     args = parser.parse_args()
 
+    if args.rollback:
+        rollback(args.rollback)
+        return
+    if args.search is None or args.replace is None:
+        parser.error("search and replace are required")
+
     if not os.path.isdir(args.path):
         print(f"Error: {args.path} is not a valid directory.")
         sys.exit(1)
 
-    # Compile regex if needed
-    flags = re.IGNORECASE if args.ignore_case else 0
-    
-    files = os.listdir(args.path)
-    if not args.hidden:
-        files = [f for f in files if not f.startswith('.')]
-    
-    # Filter out directories
-    files = [f for f in files if os.path.isfile(os.path.join(args.path, f))]
-    files.sort()
-
-    changes = []
-
-    for filename in files:
-        new_name = None
-        if args.regex:
-            try:
-                new_name = re.sub(args.search, args.replace, filename, flags=flags)
-            except re.error as e:
-                print(f"Regex Error: {e}")
-                sys.exit(1)
-        else:
-            if args.ignore_case:
-                # Case insensitive literal replace is a bit tricky in Python without regex
-                # We'll use regex for it anyway but escape the search string
-                pattern = re.escape(args.search)
-                new_name = re.sub(pattern, args.replace, filename, flags=re.IGNORECASE)
-            else:
-                new_name = filename.replace(args.search, args.replace)
+    try:
+        rename = make_renamer(args.search, args.replace, args.regex, args.ignore_case)
+        changes, steps, skipped, cycles = plan_renames(args.path, rename, args.recursive, args.hidden)
+    except re.error as e:
+        print(f"Regex Error: {e}")
+        sys.exit(1)
 
-        if new_name != filename:
-            changes.append((filename, new_name))
+    for old, new, reason in skipped:
+        print(f"[!] Warning: Skipping '{old}' -> '{new}' ({reason})")
 
     if not changes:
         print("No files match the search pattern.")
@@ -66,33 +418,32 @@ def main():
 
     print(f"{'DRY RUN MODE' if not args.commit else 'COMMITTING CHANGES'}")
     print("-" * 60)
-    
-    for old, new in changes:
-        print(f"{old}  ->  {new}")
+
+    if not args.quiet:
+        # One write for the whole listing; a print per file dominates large runs
+        sys.stdout.write("".join(f"{old}  ->  {new}\n" for old, new in changes))
 
     print("-" * 60)
     print(f"Total files to rename: {len(changes)}")
+    if cycles:
+        print(f"Swaps/cycles resolved through a temporary name: {cycles}")
 
     if args.commit:
-        confirm = input("Are you sure you want to proceed? (y/N): ")
-        if confirm.lower() != 'y':
-            print("Aborted.")
-            return
+        if not args.yes:
+            confirm = input("Are you sure you want to proceed? (y/N): ")
+            if confirm.lower() != 'y':
+                print("Aborted.")
+                return
 
-        for old, new in changes:
-            old_path = os.path.join(args.path, old)
-            new_path = os.path.join(args.path, new)
-            
-            if os.path.exists(new_path):
-                print(f"[!] Warning: Skipping '{old}' -> '{new}' (Target already exists)")
-                continue
-                
-            try:
-                os.rename(old_path, new_path)
-            except Exception as e:
-                print(f"[!] Error renaming '{old}': {e}")
-        
-        print("Done.")
+        journal_path = args.journal or os.path.join(args.path, f"{JOURNAL_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl")
+        journal = Journal(journal_path, os.path.abspath(args.path))
+        try:
+            renamed, errors = apply_steps(steps, journal)
+        finally:
+            journal.close()
+
+        print("Done." if not errors else f"Done with {errors} errors.")
+        print(f"Journal: {journal_path} (undo with --rollback)")
     else:
         print("This was a dry run. Use --commit (and 'y' to confirm) to apply these changes.")
 
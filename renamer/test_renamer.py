@@ -0,0 +1,136 @@
+"""Regression checks for committing and rolling back renames.
+
+Run with `python3 -m unittest test_renamer` from this directory.
+"""
+
+import io
+import os
+import errno
+import tempfile
+import unittest
+import contextlib
+from unittest import mock
+
+import renamer
+
+
+class RenameTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.realpath(self.tmp.name)
+        self.journal_path = os.path.join(self.root, ".renamer-journal-test.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make(self, *names, subdir=""):
+        for name in names:
+            path = os.path.join(self.root, subdir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(name)
+
+    def contents(self, subdir=""):
+        """Map each file name to the name it had when created (its contents)."""
+        directory = os.path.join(self.root, subdir)
+        result = {}
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path) and not name.startswith(renamer.JOURNAL_PREFIX):
+                with open(path) as f:
+                    result[name] = f.read()
+        return result
+
+    def plan(self, mapping):
+        return renamer.plan_renames(self.root, lambda name: mapping.get(name, name))
+
+    def commit(self, steps):
+        journal = renamer.Journal(self.journal_path, self.root)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()) as out:
+                renamed, errors = renamer.apply_steps(steps, journal)
+        finally:
+            journal.close()
+        return renamed, errors, out.getvalue()
+
+    def rollback(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            renamer.rollback(self.journal_path)
+
+    def test_chain_and_swap_round_trip(self):
+        self.make("a", "b", "x1", "x2")
+        # a -> b -> c is a chain; x1 <-> x2 is a cycle
+        _, steps, skipped, cycles = self.plan({"a": "b", "b": "c", "x1": "x2", "x2": "x1"})
+        self.assertEqual((skipped, cycles), ([], 1))
+        renamed, errors, _ = self.commit(steps)
+        self.assertEqual(errors, 0)
+        self.assertEqual(self.contents(), {"b": "a", "c": "b", "x1": "x2", "x2": "x1"})
+
+        self.rollback()
+        self.assertEqual(self.contents(), {"a": "a", "b": "b", "x1": "x1", "x2": "x2"})
+
+    def test_target_created_after_planning_is_kept(self):
+        self.make("a", "b")
+        _, steps, _, _ = self.plan({"a": "b", "b": "c"})
+        # Appears while the confirmation prompt is open
+        with open(os.path.join(self.root, "c"), "w") as f:
+            f.write("new")
+
+        renamed, errors, out = self.commit(steps)
+        self.assertEqual((renamed, errors), (0, 1))
+        self.assertIn("(Target already exists)", out)
+        self.assertEqual(self.contents(), {"a": "a", "b": "b", "c": "new"})
+
+        self.rollback()
+        self.assertEqual(self.contents(), {"a": "a", "b": "b", "c": "new"})
+
+    def test_failed_cycle_is_unwound(self):
+        self.make("x1", "x2", "x3")
+        _, steps, _, cycles = self.plan({"x1": "x2", "x2": "x3", "x3": "x1"})
+        self.assertEqual(cycles, 1)
+
+        real = renamer.rename_noreplace
+        def flaky(old, new, dir_fd):
+            if (old, new) == ("x2", "x3"):
+                raise PermissionError(errno.EACCES, "Permission denied")
+            real(old, new, dir_fd)
+
+        with mock.patch.object(renamer, "rename_noreplace", flaky):
+            renamed, errors, _ = self.commit(steps)
+        self.assertEqual((renamed, errors), (0, 1))
+        self.assertEqual(self.contents(), {"x1": "x1", "x2": "x2", "x3": "x3"})
+
+        # Nothing took effect, so rolling back must not move anything either
+        self.rollback()
+        self.assertEqual(self.contents(), {"x1": "x1", "x2": "x2", "x3": "x3"})
+
+    def test_recursive_round_trip(self):
+        self.make("img1.jpg", "img2.jpg")
+        self.make("img1.jpg", "img3.jpg", subdir="sub")
+        rename = renamer.make_renamer("img", "photo")
+        _, steps, _, _ = renamer.plan_renames(self.root, rename, recursive=True)
+        renamed, errors, _ = self.commit(steps)
+        self.assertEqual((renamed, errors), (4, 0))
+        self.assertEqual(set(self.contents()), {"photo1.jpg", "photo2.jpg"})
+        self.assertEqual(set(self.contents("sub")), {"photo1.jpg", "photo3.jpg"})
+
+        self.rollback()
+        self.assertEqual(set(self.contents()), {"img1.jpg", "img2.jpg"})
+        self.assertEqual(set(self.contents("sub")), {"img1.jpg", "img3.jpg"})
+
+    def test_fallback_without_renameat2_never_replaces(self):
+        self.make("p", "q")
+        fd = os.open(self.root, os.O_RDONLY)
+        try:
+            with mock.patch.object(renamer, "RENAMEAT2", None):
+                with self.assertRaises(FileExistsError):
+                    renamer.rename_noreplace("p", "q", fd)
+                renamer.rename_noreplace("p", "r", fd)
+        finally:
+            os.close(fd)
+        self.assertEqual(self.contents(), {"q": "q", "r": "p"})
+
+
+if __name__ == "__main__":
+    unittest.main()
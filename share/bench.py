@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for share.py.
+
+Usage:
+    python3 bench.py upload [--size MB] [--mode single|threaded|asyncio]
+    python3 bench.py download [--size MB] [--count N] [--mode single|threaded|asyncio]
+    python3 bench.py metrics [--requests N] [--mode single|threaded|asyncio]
+
+Each benchmark starts share.py on a free local port in a temporary
+directory and talks to it over a real socket. Server CPU time and peak RSS
+come from /proc, so those columns are only filled in on Linux.
+"""
+
+import os
+import sys
+import time
+import socket
+import signal
+import argparse
+import tempfile
+import subprocess
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "share.py")
+
+# Request bodies are generated and sent in blocks of this size
+BLOCK_SIZE = 1024 * 1024
+BOUNDARY = b"----sharebench"
+
+# Runs share.py with downloads forced onto the buffered copy instead of sendfile()
+NO_SENDFILE = ("import sys; sys.path.insert(0, sys.argv.pop(1)); import share; "
+               "share.USE_SENDFILE = False; sys.argv[0] = share.__file__; share.main()")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Server:
+    """share.py running in a subprocess for the length of a with block."""
+
+    def __init__(self, directory, mode="threaded", sendfile=True):
+        self.port = free_port()
+        command = [sys.executable, SCRIPT] if sendfile else \
+            [sys.executable, "-c", NO_SENDFILE, os.path.dirname(SCRIPT)]
+        self.proc = subprocess.Popen(command + [str(self.port), "--mode", mode],
+                                     cwd=directory, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def __enter__(self):
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=1).close()
+                return self
+            except OSError:
+                time.sleep(0.05)
+        self.proc.kill()
+        raise RuntimeError("share.py did not start")
+
+    def __exit__(self, *exc):
+        self.proc.send_signal(signal.SIGINT)
+        try:
+            self.proc.wait(5)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+
+    def cpu_seconds(self):
+        """User + system CPU time of the server so far, or None without /proc."""
+        try:
+            with open(f"/proc/{self.proc.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            return None
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    def peak_rss_mb(self):
+        """Peak resident memory of the server in MB, or None without /proc."""
+        try:
+            with open(f"/proc/{self.proc.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        return None
+
+
+def read_response(sock):
+    """Read one response with a Content-Length body; returns (status, body length)."""
+    data = b""
+    while b"\r\n\r\n" not in data:
+        chunk = sock.recv(65536)
+        if not chunk:
+            raise ConnectionError("connection closed mid-response")
+        data += chunk
+    head, body = data.split(b"\r\n\r\n", 1)
+    lines = head.split(b"\r\n")
+    status = int(lines[0].split()[1])
+    length = 0
+    for line in lines[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value)
+    remaining = length - len(body)
+    while remaining > 0:
+        chunk = sock.recv(min(remaining, 1 << 20))
+        if not chunk:
+            raise ConnectionError("connection closed mid-body")
+        remaining -= len(chunk)
+    return status, length
+
+
+def request(port, data):
+    """Send one request on a new connection; returns (status, body length)."""
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        sock.sendall(data)
+        return read_response(sock)
+
+
+def fmt(value, spec):
+    return "n/a" if value is None else format(value, spec)
+
+
+def upload_block(kind):
+    """One BLOCK_SIZE block of upload payload.
+
+    'binary' has no newlines at all and 'text' has one every 80 bytes: the
+    two shapes that made a line-based parser build huge lines or make
+    millions of tiny reads.
+    """
+    if kind == "binary":
+        return os.urandom(BLOCK_SIZE).replace(b"\n", b"\0")
+    line = b"x" * 79 + b"\n"
+    return (line * (BLOCK_SIZE // len(line) + 1))[:BLOCK_SIZE]
+
+
+def bench_upload(size_mb, mode):
+    """POST a size_mb multipart upload of each payload kind; print MB/s, server CPU and RSS."""
+    print(f"[*] Upload {size_mb} MB per run, {mode} mode")
+    for kind in ("binary", "text"):
+        block = upload_block(kind)
+        head = (b"--" + BOUNDARY + b"\r\n"
+                b'Content-Disposition: form-data; name="file"; filename="upload.bin"\r\n'
+                b"Content-Type: application/octet-stream\r\n\r\n")
+        tail = b"\r\n--" + BOUNDARY + b"--\r\n"
+        length = len(head) + size_mb * BLOCK_SIZE + len(tail)
+        with tempfile.TemporaryDirectory() as tmp, Server(tmp, mode) as server:
+            cpu = server.cpu_seconds()
+            start = time.perf_counter()
+            with socket.create_connection(("127.0.0.1", server.port)) as sock:
+                sock.sendall(b"POST / HTTP/1.1\r\nHost: bench\r\n"
+                             b"Content-Type: multipart/form-data; boundary=" + BOUNDARY + b"\r\n"
+                             b"Content-Length: %d\r\n\r\n" % length + head)
+                for _ in range(size_mb):
+                    sock.sendall(block)
+                sock.sendall(tail)
+                status, _ = read_response(sock)
+            elapsed = time.perf_counter() - start
+            cpu = None if cpu is None else server.cpu_seconds() - cpu
+            saved = os.path.getsize(os.path.join(tmp, "upload.bin"))
+            if status != 200 or saved != size_mb * BLOCK_SIZE:
+                print(f"    {kind:<6} FAILED: status {status}, saved {saved} bytes")
+                sys.exit(1)
+            gb = size_mb / 1024
+            print(f"    {kind:<6} {size_mb / elapsed:8.1f} MB/s   "
+                  f"server CPU {fmt(cpu and cpu / gb, '6.2f')} s/GB   "
+                  f"peak RSS {fmt(server.peak_rss_mb(), '6.1f')} MB")
+
+
+def bench_download(size_mb, count, mode):
+    """GET a size_mb file `count` times with sendfile() and with the buffered copy.
+
+    Server CPU per GB is the number to compare; wall-clock MB/s over
+    loopback is mostly the client's own receive cost. A resumed download
+    (Range: bytes=N-) is checked along the way.
+    """
+    print(f"[*] Download {size_mb} MB x {count}, {mode} mode")
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "download.bin"), "wb") as f:
+            block = os.urandom(BLOCK_SIZE)
+            for _ in range(size_mb):
+                f.write(block)
+        size = size_mb * BLOCK_SIZE
+        for label, sendfile in (("sendfile", True), ("copy", False)):
+            with Server(tmp, mode, sendfile) as server:
+                status, length = request(server.port, b"GET /download.bin HTTP/1.1\r\nHost: bench\r\n"
+                                                      b"Range: bytes=%d-\r\n\r\n" % (size // 2))
+                if status != 206 or length != size - size // 2:
+                    print(f"    {label:<8} FAILED: resumed download got {status} with {length} bytes")
+                    sys.exit(1)
+
+                cpu = server.cpu_seconds()
+                start = time.perf_counter()
+                for _ in range(count):
+                    status, length = request(server.port, b"GET /download.bin HTTP/1.1\r\nHost: bench\r\n\r\n")
+                    if status != 200 or length != size:
+                        print(f"    {label:<8} FAILED: status {status} with {length} bytes")
+                        sys.exit(1)
+                elapsed = time.perf_counter() - start
+                cpu = None if cpu is None else server.cpu_seconds() - cpu
+                gb = size_mb * count / 1024
+                print(f"    {label:<8} {size_mb * count / elapsed:8.1f} MB/s   "
+                      f"server CPU {fmt(cpu and cpu / gb, '6.3f')} s/GB")
+
+
+def hook_cost_us(iterations=200000):
+    """Microseconds the METRICS hooks add to one request, timed in this process.
+
+    Replays what CustomHTTPRequestHandler does for each request (two clocks,
+    the Content-Length lookup, request_done, a connection opened and closed)
+    and the byte counting of a response written in two pieces.
+    """
+    sys.path.insert(0, os.path.dirname(SCRIPT))
+    import share
+    metrics = share.Metrics()
+    headers = {"content-length": "0"}
+    out = share.CountingWriter(open(os.devnull, "wb"))
+    raw = out.wfile
+    data = b"x" * 1024
+
+    def hooked():
+        metrics.connection_opened()
+        start = time.perf_counter()
+        out.write(data)
+        out.write(data)
+        bytes_in = int(headers.get("content-length", 0))
+        metrics.request_done("GET", 200, time.perf_counter() - start, bytes_in, out.bytes)
+        metrics.connection_closed()
+
+    def bare():
+        raw.write(data)
+        raw.write(data)
+
+    timings = []
+    for fn in (hooked, bare):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        timings.append(time.perf_counter() - start)
+    raw.close()
+    return (timings[0] - timings[1]) / iterations * 1e6
+
+
+def bench_metrics(requests, mode):
+    """Compare the per-request cost of the METRICS hooks with a small GET served end to end."""
+    print(f"[*] Metrics overhead, {requests} requests for a 1 KB file, {mode} mode")
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "small.txt"), "wb") as f:
+            f.write(b"x" * 1024)
+        with Server(tmp, mode) as server:
+            start = time.perf_counter()
+            for _ in range(requests):
+                status, _ = request(server.port, b"GET /small.txt HTTP/1.1\r\nHost: bench\r\n\r\n")
+                if status != 200:
+                    print(f"    FAILED: status {status}")
+                    sys.exit(1)
+            latency = (time.perf_counter() - start) / requests * 1e6
+    hooks = hook_cost_us()
+    print(f"    request {latency:8.1f} us   hooks {hooks:6.2f} us   overhead {hooks / latency * 100:5.2f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark share.py over a local socket.")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    upload = sub.add_parser("upload", help="Multipart upload throughput, server CPU and memory")
+    upload.add_argument("--size", type=int, default=1024, help="Upload size in MB (default: 1024)")
+    upload.add_argument("--mode", choices=["single", "threaded", "asyncio"], default="threaded",
+                        help="share.py concurrency mode (default: threaded)")
+
+    download = sub.add_parser("download", help="Download server CPU per GB, sendfile() against a buffered copy")
+    download.add_argument("--size", type=int, default=1024, help="File size in MB (default: 1024)")
+    download.add_argument("--count", type=int, default=4, help="Downloads per variant (default: 4)")
+    download.add_argument("--mode", choices=["single", "threaded", "asyncio"], default="threaded",
+                          help="share.py concurrency mode (default: threaded)")
+
+    metrics = sub.add_parser("metrics", help="Per-request cost of the /metrics instrumentation")
+    metrics.add_argument("--requests", type=int, default=2000, help="Requests to time (default: 2000)")
+    metrics.add_argument("--mode", choices=["single", "threaded", "asyncio"], default="threaded",
+                         help="share.py concurrency mode (default: threaded)")
+
+    args = parser.parse_args()
+    if args.bench == "upload":
+        bench_upload(max(1, args.size), args.mode)
+    elif args.bench == "download":
+        bench_download(max(1, args.size), max(1, args.count), args.mode)
+    elif args.bench == "metrics":
+        bench_metrics(max(1, args.requests), args.mode)
+
+
+if __name__ == "__main__":
+    main()
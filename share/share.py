@@ -4,32 +4,738 @@ Share.py - The LAN Dropzone
 A zero-dependency HTTP server that supports file uploads.
 
 Usage:
-    python3 share.py [port]
+    python3 share.py [port] [--mode single|threaded|asyncio] [--workers N]
+                     [--max-connections N] [--queue-depth N] [--timeout SEC]
 
 Features:
     - Serves files from current directory (like python -m http.server)
     - Accepts file uploads via POST
     - Simple drag-and-drop web interface
+    - Threaded or asyncio serving so one slow client doesn't block the rest
 """
 
 import http.server
 import socketserver
 import os
 import sys
-import cgi
 import shutil
 import io
+import html
+import json
+import time
+import urllib.parse
+import gzip
+import zlib
+import zipfile
+import bisect
+import socket
+import argparse
+import asyncio
+import threading
+import traceback
+import email.utils
+import datetime
+import uuid
+import queue
+from collections import OrderedDict
+from concurrent.futures import Future
 
 # Default port
 PORT = 8000
-if len(sys.argv) > 1:
-    try:
-        PORT = int(sys.argv[1])
-    except ValueError:
-        print(f"Invalid port: {sys.argv[1]}")
-        sys.exit(1)
+
+# Concurrency defaults
+WORKERS = 16
+MAX_CONNECTIONS = 256
+QUEUE_DEPTH = 64
+TIMEOUT = 30
+
+# Sent to clients turned away because every limit is reached
+BUSY_RESPONSE = (b"HTTP/1.0 503 Service Unavailable\r\n"
+                 b"Retry-After: 1\r\n"
+                 b"Content-Length: 0\r\n"
+                 b"Connection: close\r\n\r\n")
+
+# Uploads are read in fixed-size buffers so memory stays bounded
+CHUNK_SIZE = 256 * 1024
+MAX_HEADER_SIZE = 16 * 1024
+MAX_FIELD_SIZE = 1024 * 1024
+
+# Resumable uploads: see UploadSession
+UPLOAD_PREFIX = '/_upload'
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_UPLOAD_CHUNK_SIZE = 64 * 1024 * 1024
+UPLOAD_TTL = 24 * 3600
+
+# Compression: gzip for text-like bodies, small hot files kept compressed in memory
+GZIP_LEVEL = 6
+MIN_GZIP_SIZE = 1024
+GZIP_CACHE_SIZE = 64 * 1024 * 1024
+GZIP_CACHE_ENTRY_SIZE = 4 * 1024 * 1024
+COMPRESSIBLE_TYPES = {
+    'application/json', 'application/javascript', 'application/x-javascript',
+    'application/xml', 'application/xhtml+xml', 'application/x-sh',
+    'application/x-ndjson', 'image/svg+xml',
+}
+
+# Metrics: histogram bucket bounds, and the smallest upload worth timing
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+THROUGHPUT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+MIN_UPLOAD_SAMPLE = 1024 * 1024
+METRIC_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'DELETE'}
+
+# Directory listings
+PAGE_SIZE = 1000
+LISTING_CACHE_SIZE = 128
+
+# Downloads use sendfile() when the OS has it, big buffered copies otherwise
+USE_SENDFILE = hasattr(os, 'sendfile')
+COPY_BUFSIZE = 1024 * 1024
+# More ranges than this in one request is treated as no Range header at all
+MAX_RANGES = 16
+
+
+def parse_header(line):
+    """Split a header like 'form-data; name="file"' into ('form-data', {'name': 'file'})."""
+    parts = line.split(';')
+    key = parts[0].strip().lower()
+    params = {}
+    for part in parts[1:]:
+        if '=' not in part:
+            continue
+        name, value = part.split('=', 1)
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] == '"':
+            value = value[1:-1].replace('\\\\', '\\').replace('\\"', '"')
+        params[name.strip().lower()] = value
+    return key, params
+
+
+class UploadSession:
+    """A chunked upload being reassembled on the server.
+
+    Chunks may arrive in any order and in parallel; each one is written at
+    its offset into a temp file preallocated to the final size, next to the
+    destination. finish() fsyncs it and renames it into place atomically.
+    """
+
+    def __init__(self, name, size, chunk_size, directory):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.size = size
+        self.chunk_size = chunk_size
+        self.chunks = max(1, -(-size // chunk_size))
+        self.path = os.path.join(directory, name)
+        self.tmp_path = os.path.join(directory, '.%s.%s.part' % (name, self.id))
+        self.received = set()
+        self.writers = 0
+        self.closed = False
+        self.lock = threading.Lock()
+        self.touched = time.time()
+
+        self.fd = os.open(self.tmp_path, os.O_RDWR | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            try:
+                os.posix_fallocate(self.fd, 0, size)
+            except (AttributeError, OSError, ValueError):
+                # Not every OS/filesystem can reserve blocks; a sparse file will do
+                os.ftruncate(self.fd, size)
+        except OSError:
+            self.abort()
+            raise
+
+    def chunk_length(self, index):
+        return max(0, min(self.chunk_size, self.size - index * self.chunk_size))
+
+    def write_chunk(self, index, rfile, length):
+        """Copy chunk `index` (`length` bytes) from `rfile` into the temp file."""
+        with self.lock:
+            if self.closed:
+                raise KeyError(self.id)
+            self.writers += 1
+        try:
+            offset = index * self.chunk_size
+            while length > 0:
+                data = rfile.read(min(CHUNK_SIZE, length))
+                if not data:
+                    raise ValueError("Unexpect Ends of data.")
+                length -= len(data)
+                self._pwrite(data, offset)
+                offset += len(data)
+        finally:
+            with self.lock:
+                self.writers -= 1
+        with self.lock:
+            self.received.add(index)
+            self.touched = time.time()
+
+    def _pwrite(self, data, offset):
+        if hasattr(os, 'pwrite'):
+            view = memoryview(data)
+            while view:
+                n = os.pwrite(self.fd, view, offset)
+                view = view[n:]
+                offset += n
+        else:
+            with self.lock:
+                os.lseek(self.fd, offset, os.SEEK_SET)
+                os.write(self.fd, data)
+
+    def received_ranges(self):
+        """Byte ranges received so far, as sorted [start, end) pairs."""
+        with self.lock:
+            indexes = sorted(self.received)
+        ranges = []
+        for index in indexes:
+            start = index * self.chunk_size
+            end = start + self.chunk_length(index)
+            if ranges and ranges[-1][1] == start:
+                ranges[-1][1] = end
+            else:
+                ranges.append([start, end])
+        return ranges
+
+    def status(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'size': self.size,
+            'chunk_size': self.chunk_size,
+            'chunks': self.chunks,
+            'received': self.received_ranges(),
+            'complete': len(self.received) == self.chunks,
+        }
+
+    def finish(self):
+        """Move the finished file into place. Returns an error message or None."""
+        with self.lock:
+            missing = self.chunks - len(self.received)
+            if missing:
+                return "%d chunk(s) still missing" % missing
+            if self.writers:
+                return "Chunks are still being written"
+            self.closed = True
+        try:
+            os.fsync(self.fd)
+            os.replace(self.tmp_path, self.path)
+        finally:
+            self.close_fd()
+        return None
+
+    def close_fd(self):
+        """Close the temp file once; the fd number may be reused as soon as it is closed."""
+        with self.lock:
+            fd, self.fd = getattr(self, 'fd', None), None
+        if fd is not None:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def abort(self):
+        with self.lock:
+            self.closed = True
+        self.close_fd()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+
+UPLOADS = {}
+UPLOADS_LOCK = threading.Lock()
+
+
+def expire_uploads():
+    """Drop sessions nobody has touched for UPLOAD_TTL seconds."""
+    cutoff = time.time() - UPLOAD_TTL
+    with UPLOADS_LOCK:
+        stale = [session for session in UPLOADS.values() if session.touched < cutoff and not session.writers]
+        for session in stale:
+            del UPLOADS[session.id]
+    for session in stale:
+        session.abort()
+
+
+class ListingCache:
+    """LRU cache of sorted directory listings.
+
+    Each listing is built with a single os.scandir() pass, reusing the type
+    information scandir already has, and stays valid until the directory's
+    device, inode or mtime changes.
+    """
+
+    def __init__(self, max_dirs=LISTING_CACHE_SIZE):
+        self.max_dirs = max_dirs
+        self.listings = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        """Return [(name, is_dir, is_link), ...] for `path`, sorted case-insensitively."""
+        # Stat before scanning: a change made during the scan bumps the mtime
+        # past the one we store, so the next request rebuilds the listing
+        st = os.stat(path)
+        key = (st.st_dev, st.st_ino, st.st_mtime_ns)
+        with self.lock:
+            cached = self.listings.get(path)
+            if cached is not None and cached[0] == key:
+                self.listings.move_to_end(path)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        entries = self.scan(path)
+        # A directory changed within the last second may change again without
+        # moving its mtime on coarse-grained filesystems, so don't trust it yet
+        if time.time() - st.st_mtime > 1:
+            with self.lock:
+                self.listings[path] = (key, entries)
+                self.listings.move_to_end(path)
+                while len(self.listings) > self.max_dirs:
+                    self.listings.popitem(last=False)
+        return entries
+
+    @staticmethod
+    def scan(path):
+        entries = []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                entries.append((entry.name, is_dir, entry.is_symlink()))
+        entries.sort(key=lambda e: e[0].lower())
+        return entries
+
+
+LISTING_CACHE = ListingCache()
+
+
+def is_compressible(ctype):
+    ctype = ctype.split(';')[0].strip().lower()
+    return ctype.startswith('text/') or ctype in COMPRESSIBLE_TYPES
+
+
+class GzipCache:
+    """LRU cache of gzip-compressed file bodies, bounded by total compressed size."""
+
+    def __init__(self, max_bytes=GZIP_CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self.bodies = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, path, fs, f):
+        """Return the compressed contents of the open file `f`, reusing a cached copy if current."""
+        key = (fs.st_dev, fs.st_ino, fs.st_size, fs.st_mtime_ns)
+        with self.lock:
+            cached = self.bodies.get(path)
+            if cached is not None and cached[0] == key:
+                self.bodies.move_to_end(path)
+                return cached[1]
+
+        body = gzip.compress(f.read(), GZIP_LEVEL, mtime=0)
+        with self.lock:
+            old = self.bodies.pop(path, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self.bodies[path] = (key, body)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self.bodies.popitem(last=False)
+                self.size -= len(evicted)
+        return body
+
+
+GZIP_CACHE = GzipCache()
+
+
+class Histogram:
+    """Fixed-bucket histogram; counts are kept per bucket, not cumulative."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def prometheus(self, name):
+        lines = ['# TYPE %s histogram' % name]
+        total = 0
+        for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+            total += count
+            lines.append('%s_bucket{le="%s"} %d' % (name, bound, total))
+        lines.append('%s_sum %f' % (name, self.sum))
+        lines.append('%s_count %d' % (name, self.count))
+        return lines
+
+
+class Metrics:
+    """Server-wide counters behind /metrics and /stats.
+
+    Each request takes the lock once, in request_done(), so the hooks stay
+    cheap enough to leave on.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.upload_mbps = Histogram(THROUGHPUT_BUCKETS)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.connections = 0
+
+    def connection_opened(self):
+        with self.lock:
+            self.connections += 1
+
+    def connection_closed(self):
+        with self.lock:
+            self.connections -= 1
+
+    def request_done(self, method, status, seconds, bytes_in, bytes_out):
+        if method not in METRIC_METHODS:
+            method = 'OTHER'
+        key = (method, status)
+        with self.lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.latency.observe(seconds)
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            if bytes_in >= MIN_UPLOAD_SAMPLE and seconds > 0:
+                self.upload_mbps.observe(bytes_in / seconds / 1e6)
+
+    def stats(self):
+        with self.lock:
+            requests = {}
+            for (method, status), count in sorted(self.requests.items()):
+                requests.setdefault(method, {})[str(status)] = count
+            latency, uploads = self.latency, self.upload_mbps
+            stats = {
+                'uptime_seconds': round(time.time() - self.started, 3),
+                'active_connections': self.connections,
+                'requests': requests,
+                'latency_seconds': {
+                    'count': latency.count,
+                    'mean': latency.sum / latency.count if latency.count else 0,
+                    'buckets': dict(zip([str(b) for b in latency.bounds] + ['+Inf'], latency.counts)),
+                },
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'uploads': {
+                    'count': uploads.count,
+                    'mean_mbps': uploads.sum / uploads.count if uploads.count else 0,
+                },
+            }
+        hits, misses = LISTING_CACHE.hits, LISTING_CACHE.misses
+        stats['listing_cache'] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0,
+        }
+        return stats
+
+    def prometheus(self):
+        with self.lock:
+            lines = ['# TYPE share_requests_total counter']
+            for (method, status), count in sorted(self.requests.items()):
+                lines.append('share_requests_total{method="%s",status="%d"} %d' % (method, status, count))
+            lines += self.latency.prometheus('share_request_duration_seconds')
+            lines += self.upload_mbps.prometheus('share_upload_throughput_mbps')
+            lines += [
+                '# TYPE share_received_bytes_total counter',
+                'share_received_bytes_total %d' % self.bytes_in,
+                '# TYPE share_sent_bytes_total counter',
+                'share_sent_bytes_total %d' % self.bytes_out,
+                '# TYPE share_active_connections gauge',
+                'share_active_connections %d' % self.connections,
+                '# TYPE share_start_time_seconds gauge',
+                'share_start_time_seconds %f' % self.started,
+            ]
+        lines += [
+            '# TYPE share_listing_cache_hits_total counter',
+            'share_listing_cache_hits_total %d' % LISTING_CACHE.hits,
+            '# TYPE share_listing_cache_misses_total counter',
+            'share_listing_cache_misses_total %d' % LISTING_CACHE.misses,
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
+
+
+class CountingWriter:
+    """Wraps the response stream and counts the bytes written to it."""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.bytes = 0
+
+    def write(self, data):
+        n = self.wfile.write(data)
+        self.bytes += len(data)
+        return n
+
+    def flush(self):
+        self.wfile.flush()
+
+    def close(self):
+        self.wfile.close()
+
+    @property
+    def closed(self):
+        return self.wfile.closed
+
+
+class StreamWriter:
+    """Writes a response body of unknown length, chunk-encoded when HTTP/1.1 allows it."""
+
+    def __init__(self, wfile, chunked):
+        self.wfile = wfile
+        self.chunked = chunked
+
+    def write(self, data):
+        if not data:
+            return 0
+        if self.chunked:
+            self.wfile.write(b''.join((b'%x\r\n' % len(data), data, b'\r\n')))
+        else:
+            self.wfile.write(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.chunked:
+            self.wfile.write(b'0\r\n\r\n')
+
+
+def make_etag(fs):
+    """Strong validator built from inode, size and mtime."""
+    return '"%x-%x-%x"' % (fs.st_ino, fs.st_size, fs.st_mtime_ns)
+
+
+def parse_range(header, size):
+    """Parse a 'bytes=' Range header into a list of inclusive (start, end) pairs.
+
+    Returns None when the header should be ignored (malformed, not bytes, or
+    too many ranges) and an empty list when no range is satisfiable.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec:
+        return None
+    specs = spec.split(',')
+    if len(specs) > MAX_RANGES:
+        return None
+    ranges = []
+    for item in specs:
+        first, dash, last = item.strip().partition('-')
+        if not dash:
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = size - 1
+                if last:
+                    end = int(last)
+                    if end < start:
+                        return None
+            else:
+                # Suffix range: the last N bytes
+                length = int(last)
+                if length <= 0:
+                    continue
+                start = max(size - length, 0)
+                end = size - 1
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+    return ranges
+
+
+class MultipartReader:
+    """Streaming multipart/form-data parser.
+
+    Reads at most `length` bytes from `rfile` in CHUNK_SIZE pieces and scans
+    each buffer for the boundary, so the body is never split into lines and
+    never held in memory as a whole. Iterating yields the headers of each part;
+    the part body must then be consumed with copy_part(), read_field() or
+    skip_part() before moving on to the next one.
+    """
+
+    def __init__(self, rfile, boundary, length, chunk_size=CHUNK_SIZE):
+        self.rfile = rfile
+        self.remaining = length
+        self.chunk_size = chunk_size
+        # Every delimiter, including the first one, is "\r\n--boundary"
+        self.delimiter = b'\r\n--' + boundary
+        self.buf = bytearray(b'\r\n')
+        self.in_body = False
+        self.done = False
+
+    def _fill(self):
+        """Append the next chunk of the body to the buffer. False on EOF."""
+        if self.remaining <= 0:
+            return False
+        data = self.rfile.read(min(self.chunk_size, self.remaining))
+        if not data:
+            self.remaining = 0
+            return False
+        self.remaining -= len(data)
+        self.buf += data
+        return True
+
+    def _stream_body(self, write):
+        """Feed the current part body to write() up to the next delimiter."""
+        keep = len(self.delimiter) - 1
+        while True:
+            idx = self.buf.find(self.delimiter)
+            if idx >= 0:
+                if idx:
+                    write(self.buf[:idx])
+                del self.buf[:idx + len(self.delimiter)]
+                self.in_body = False
+                return
+            # The tail may hold the start of a delimiter split across chunks
+            if len(self.buf) > keep:
+                write(self.buf[:-keep])
+                del self.buf[:-keep]
+            if not self._fill():
+                raise ValueError("Unexpect Ends of data.")
+
+    def _next_part(self):
+        """Parse the delimiter suffix and headers of the next part, or None at the end."""
+        while len(self.buf) < 2:
+            if not self._fill():
+                raise ValueError("Unexpect Ends of data.")
+        if self.buf[:2] == b'--':
+            self.done = True
+            return None
+
+        while True:
+            end = self.buf.find(b'\r\n\r\n')
+            if end >= 0:
+                break
+            if len(self.buf) > MAX_HEADER_SIZE:
+                raise ValueError("Part headers too large")
+            if not self._fill():
+                raise ValueError("Unexpect Ends of data.")
+
+        # Skip transport padding after the boundary, then the CRLF ending that line
+        lines = bytes(self.buf[:end]).split(b'\r\n')
+        del self.buf[:end + 4]
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.decode('utf-8', 'surrogateescape').partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        self.in_body = True
+        return headers
+
+    def __iter__(self):
+        # Drop the preamble up to and including the first boundary
+        self._stream_body(lambda data: None)
+        while not self.done:
+            if self.in_body:
+                self.skip_part()
+            headers = self._next_part()
+            if headers is None:
+                return
+            yield headers
+
+    def copy_part(self, out):
+        """Write the body of the current part to the file object `out`."""
+        self._stream_body(out.write)
+
+    def read_field(self, limit):
+        """Return the body of the current part, refusing anything over `limit` bytes."""
+        value = bytearray()
+
+        def collect(data):
+            if len(value) + len(data) > limit:
+                raise ValueError("Form field too large")
+            value.extend(data)
+
+        self._stream_body(collect)
+        return bytes(value)
+
+    def skip_part(self):
+        """Discard the body of the current part."""
+        self._stream_body(lambda data: None)
+
+    def drain(self, limit):
+        """Read and discard what follows the closing boundary, up to `limit` bytes.
+
+        The CRLF after the last delimiter and any epilogue are still part of
+        the body; left unread, a keep-alive connection would parse them as
+        the next request. Returns False if more than `limit` bytes remain.
+        """
+        if self.remaining > limit:
+            return False
+        self.buf.clear()
+        while self._fill():
+            self.buf.clear()
+        return True
+
 
 class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    # Plain-text formats mimetypes doesn't know, so they get compressed too
+    extensions_map = dict(http.server.SimpleHTTPRequestHandler.extensions_map, **{
+        '.log': 'text/plain', '.md': 'text/markdown', '.yaml': 'text/yaml',
+        '.yml': 'text/yaml', '.toml': 'text/plain', '.ini': 'text/plain',
+        '.conf': 'text/plain',
+    })
+
+    def setup(self):
+        super().setup()
+        self.wfile = CountingWriter(self.wfile)
+        METRICS.connection_opened()
+
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            METRICS.connection_closed()
+
+    def handle_one_request(self):
+        """Serve one request and record it in METRICS."""
+        start = time.perf_counter()
+        self.command = None
+        self.status_code = None
+        # parse_request only sets headers once they parse; a 431 or a
+        # malformed first request leaves none, and a stale set from the
+        # previous keep-alive request must not be counted again
+        self.headers = None
+        self.wfile.bytes = 0
+        super().handle_one_request()
+        if self.status_code is None:
+            # Connection closed or timed out between requests
+            return
+        bytes_in = 0
+        if self.headers is not None:
+            try:
+                bytes_in = max(0, int(self.headers.get('content-length', 0)))
+            except ValueError:
+                pass
+        METRICS.request_done(self.command, self.status_code, time.perf_counter() - start,
+                             bytes_in, self.wfile.bytes)
+
+    def send_response_only(self, code, message=None):
+        self.status_code = code
+        super().send_response_only(code, message)
+
     def do_GET(self):
         """Serve files or the upload interface."""
         # Check if asking for the special upload page if directory listing is disabled or just as a convenience
@@ -37,28 +743,323 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         
         # We will intercept the directory listing to inject our upload form
         if self.path == '/upload':
+            page = self.get_upload_page().encode()
             self.send_response(200)
             self.send_header("Content-type", "text/html")
+            self.send_header("Content-Length", str(len(page)))
             self.end_headers()
-            self.wfile.write(self.get_upload_page().encode())
+            self.wfile.write(page)
             return
+
+        if self.path == '/metrics':
+            self.send_body(METRICS.prometheus().encode(), "text/plain; version=0.0.4")
+            return
+        if self.path == '/stats':
+            self.send_body(json.dumps(METRICS.stats(), indent=2).encode(), "application/json")
+            return
+
+        if self.is_upload_api():
+            return self.handle_upload_api()
+
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query, keep_blank_values=True)
+        if 'zip' in query:
+            path = self.translate_path(self.path)
+            if os.path.isdir(path):
+                return self.send_zip(path)
             
         return super().do_GET()
 
+    def send_zip(self, path):
+        """Stream the directory tree at `path` as a ZIP archive while it is being built."""
+        name = os.path.basename(path.rstrip(os.sep)) or 'share'
+        self.send_response(200)
+        self.send_header("Content-type", "application/zip")
+        self.send_header("Content-Disposition",
+                         "attachment; filename*=UTF-8''%s.zip" % urllib.parse.quote(name, errors='surrogatepass'))
+        out = self.start_stream()
+        self.end_headers()
+
+        # ZipFile falls back to data descriptors on an unseekable stream
+        with zipfile.ZipFile(out, 'w', allowZip64=True) as zf:
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for d in dirs:
+                    full = os.path.join(root, d)
+                    zf.write(full, os.path.relpath(full, path))
+                for fn in sorted(files):
+                    full = os.path.join(root, fn)
+                    compress = zipfile.ZIP_DEFLATED if is_compressible(self.guess_type(full)) else zipfile.ZIP_STORED
+                    try:
+                        zf.write(full, os.path.relpath(full, path), compress_type=compress, compresslevel=GZIP_LEVEL)
+                    except OSError:
+                        # Unreadable or vanished since the walk: leave it out
+                        continue
+        out.close()
+
+    def start_stream(self):
+        """Set up a body of unknown length. Call before end_headers()."""
+        chunked = self.request_version == 'HTTP/1.1' and self.protocol_version == 'HTTP/1.1'
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Connection", "close")
+        return StreamWriter(self.wfile, chunked)
+
+    def accepts_gzip(self):
+        for item in self.headers.get('Accept-Encoding', '').split(','):
+            coding, params = parse_header(item)
+            if coding in ('gzip', 'x-gzip', '*'):
+                try:
+                    return float(params.get('q', 1)) > 0
+                except ValueError:
+                    return False
+        return False
+
+    def send_body(self, body, ctype):
+        """Send a complete 200 response, gzipped if it pays off and the client agrees."""
+        compress = len(body) >= MIN_GZIP_SIZE and self.accepts_gzip()
+        if compress:
+            body = gzip.compress(body, GZIP_LEVEL, mtime=0)
+        self.send_response(200)
+        self.send_header("Content-type", ctype)
+        if compress:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_head(self):
+        """Like SimpleHTTPRequestHandler.send_head, with ETags and Range support for files.
+
+        The requested byte ranges are left in self.ranges for copyfile().
+        """
+        self.ranges = None
+        self.range_boundary = None
+        self.gzip_stream = None
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) or path.endswith('/'):
+            return super().send_head()
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self.send_error(404, "File not found")
+            return None
+
+        try:
+            fs = os.fstat(f.fileno())
+            size = fs.st_size
+            etag = make_etag(fs)
+            last_modified = self.date_time_string(fs.st_mtime)
+            ctype = self.guess_type(path)
+            compressible = size >= MIN_GZIP_SIZE and is_compressible(ctype)
+            use_gzip = compressible and "Range" not in self.headers and self.accepts_gzip()
+            if use_gzip:
+                etag = etag[:-1] + '-gz"'
+
+            if self.is_not_modified(fs, etag):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                f.close()
+                return None
+
+            ranges = None
+            if "Range" in self.headers and self.if_range_matches(etag, last_modified):
+                ranges = parse_range(self.headers["Range"], size)
+
+            if ranges == []:
+                self.send_response(416)
+                self.send_header("Content-Range", "bytes */%d" % size)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                f.close()
+                return None
+
+            if use_gzip:
+                return self.send_gzip_head(f, path, fs, ctype, etag, last_modified)
+
+            if ranges is None:
+                self.send_response(200)
+                self.send_header("Content-type", ctype)
+                self.send_header("Content-Length", str(size))
+            elif len(ranges) == 1:
+                start, end = ranges[0]
+                self.send_response(206)
+                self.send_header("Content-type", ctype)
+                self.send_header("Content-Range", "bytes %d-%d/%d" % (start, end, size))
+                self.send_header("Content-Length", str(end - start + 1))
+            else:
+                self.range_boundary = uuid.uuid4().hex
+                self.range_ctype = ctype
+                length = len(self.range_trailer())
+                for start, end in ranges:
+                    length += len(self.range_part_header(start, end, size)) + end - start + 1
+                self.send_response(206)
+                self.send_header("Content-type", "multipart/byteranges; boundary=%s" % self.range_boundary)
+                self.send_header("Content-Length", str(length))
+            if compressible:
+                self.send_header("Vary", "Accept-Encoding")
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.end_headers()
+            self.ranges = ranges
+            return f
+        except:
+            f.close()
+            raise
+
+    def send_gzip_head(self, f, path, fs, ctype, etag, last_modified):
+        """Headers for a gzip-encoded file body.
+
+        Small files are compressed once and served from GZIP_CACHE; larger
+        ones are compressed on the fly by copyfile().
+        """
+        body = None
+        if fs.st_size <= GZIP_CACHE_ENTRY_SIZE:
+            body = GZIP_CACHE.get(path, fs, f)
+        self.send_response(200)
+        self.send_header("Content-type", ctype)
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        if body is not None:
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            f.close()
+            return io.BytesIO(body)
+        self.gzip_stream = self.start_stream()
+        self.end_headers()
+        return f
+
+    def is_not_modified(self, fs, etag):
+        """Evaluate If-None-Match, or If-Modified-Since when that is absent."""
+        if "If-None-Match" in self.headers:
+            tags = [t.strip() for t in self.headers["If-None-Match"].split(',')]
+            return '*' in tags or etag in tags or 'W/' + etag in tags
+        if "If-Modified-Since" in self.headers:
+            try:
+                ims = email.utils.parsedate_to_datetime(self.headers["If-Modified-Since"])
+            except (TypeError, IndexError, OverflowError, ValueError):
+                return False
+            if ims is None:
+                return False
+            if ims.tzinfo is None:
+                ims = ims.replace(tzinfo=datetime.timezone.utc)
+            return int(fs.st_mtime) <= ims.timestamp()
+        return False
+
+    def if_range_matches(self, etag, last_modified):
+        """A Range is only honoured if If-Range (when given) still matches the file."""
+        if_range = self.headers.get("If-Range")
+        if not if_range:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith('"') or if_range.startswith('W/'):
+            # Weak validators never match for ranges
+            return if_range == etag
+        return if_range == last_modified
+
+    def range_part_header(self, start, end, size):
+        return ("\r\n--%s\r\nContent-Type: %s\r\nContent-Range: bytes %d-%d/%d\r\n\r\n" % (
+            self.range_boundary, self.range_ctype, start, end, size)).encode('latin-1')
+
+    def range_trailer(self):
+        return ("\r\n--%s--\r\n" % self.range_boundary).encode('latin-1')
+
+    def copyfile(self, source, outputfile):
+        """Send files straight from the page cache; anything else is copied as usual."""
+        if not isinstance(source, io.BufferedReader) or outputfile is not self.wfile:
+            return super().copyfile(source, outputfile)
+
+        if getattr(self, 'gzip_stream', None):
+            out = self.gzip_stream
+            compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            while True:
+                data = source.read(COPY_BUFSIZE)
+                if not data:
+                    break
+                out.write(compressor.compress(data))
+            out.write(compressor.flush())
+            out.close()
+            return
+
+        ranges = getattr(self, 'ranges', None)
+        if not ranges:
+            size = os.fstat(source.fileno()).st_size
+            self.send_file_range(source, 0, size)
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            self.send_file_range(source, start, end - start + 1)
+        else:
+            size = os.fstat(source.fileno()).st_size
+            for start, end in ranges:
+                outputfile.write(self.range_part_header(start, end, size))
+                self.send_file_range(source, start, end - start + 1)
+            outputfile.write(self.range_trailer())
+
+    def send_file_range(self, f, offset, count):
+        """Send `count` bytes of `f` from `offset` to the client."""
+        if count <= 0:
+            return
+        if USE_SENDFILE:
+            # socket.sendfile() drives os.sendfile() and copes with socket timeouts
+            self.wfile.bytes += self.connection.sendfile(f, offset, count)
+            return
+        f.seek(offset)
+        buf = bytearray(min(COPY_BUFSIZE, count))
+        view = memoryview(buf)
+        while count > 0:
+            n = f.readinto(view[:min(len(buf), count)])
+            if not n:
+                break
+            self.wfile.write(view[:n])
+            count -= n
+
     def list_directory(self, path):
         """Helper to produce a directory listing (absent index.html).
         We override this to inject the upload form at the top of the listing.
+
+        Listings come from LISTING_CACHE and are split into pages of
+        ?per_page= entries (default PAGE_SIZE); ?format=json returns the
+        requested page as JSON instead of HTML.
         """
         try:
-            list = os.listdir(path)
+            entries = LISTING_CACHE.get(path)
         except OSError:
             self.send_error(404, "No permission to list directory")
             return None
-        
-        list.sort(key=lambda a: a.lower())
+
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        try:
+            per_page = max(1, int(query.get('per_page', [PAGE_SIZE])[0]))
+            page = max(1, int(query.get('page', [1])[0]))
+        except ValueError:
+            self.send_error(400, "Invalid page")
+            return None
+        pages = max(1, -(-len(entries) // per_page))
+        page = min(page, pages)
+        shown = entries[(page - 1) * per_page:page * per_page]
+
+        if query.get('format', [''])[0] == 'json':
+            body = json.dumps({
+                'path': urllib.parse.unquote(urllib.parse.urlsplit(self.path).path),
+                'total': len(entries),
+                'page': page,
+                'pages': pages,
+                'per_page': per_page,
+                'entries': [{'name': name, 'is_dir': is_dir, 'is_link': is_link}
+                            for name, is_dir, is_link in shown],
+            }, ensure_ascii=False).encode('utf-8', 'surrogateescape')
+            self.send_body(body, "application/json")
+            return None
+
         r = []
         try:
-            displaypath = cgi.escape(self.path, quote=True)
+            displaypath = html.escape(urllib.parse.unquote(urllib.parse.urlsplit(self.path).path,
+                                                           errors='surrogatepass'), quote=False)
             enc = sys.getfilesystemencoding()
             title = 'Directory listing for %s' % displaypath
             r.append('<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 4.01//EN" "http://www.w3.org/TR/html4/strict.dtd">')
@@ -69,39 +1070,51 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             
             # --- INJECT UPLOAD FORM ---
             r.append(self.get_upload_form_html())
+            r.append('<p><a href="?zip">Download this folder as ZIP</a></p>')
             r.append('<hr>\n<ul>')
             
-            for name in list:
-                fullname = os.path.join(path, name)
+            for name, is_dir, is_link in shown:
                 displayname = linkname = name
                 # Append / for directories or @ for symbolic links
-                if os.path.isdir(fullname):
+                if is_dir:
                     displayname = name + "/"
                     linkname = name + "/"
-                if os.path.islink(fullname):
+                if is_link:
                     displayname = name + "@"
                     # Note: a link to a directory displays with @ and links with /
                 
                 r.append('<li><a href="%s">%s</a></li>' % (
-                    cgi.escape(linkname, quote=True),
-                    cgi.escape(displayname, quote=True)))
+                    urllib.parse.quote(linkname, errors='surrogatepass'),
+                    html.escape(displayname, quote=False)))
             
-            r.append('</ul>\n<hr>\n</body>\n</html>\n')
+            r.append('</ul>\n<hr>')
+            if pages > 1:
+                r.append(self.get_page_links(page, pages, per_page, len(entries)))
+            r.append('</body>\n</html>\n')
         except Exception as e:
             # Fallback if something breaks in our injection
             print(f"Error generating listing: {e}")
             return super().list_directory(path)
             
         encoded = ''.join(r).encode(enc, 'surrogateescape')
-        self.send_response(200)
-        self.send_header("Content-type", "text/html; charset=%s" % enc)
-        self.send_header("Content-Length", str(len(encoded)))
-        self.end_headers()
-        self.wfile.write(encoded)
+        self.send_body(encoded, "text/html; charset=%s" % enc)
         return None
 
+    def get_page_links(self, page, pages, per_page, total):
+        links = []
+        suffix = '' if per_page == PAGE_SIZE else '&per_page=%d' % per_page
+        if page > 1:
+            links.append('<a href="?page=%d%s">&laquo; Previous</a>' % (page - 1, suffix))
+        links.append('Page %d of %d (%d entries)' % (page, pages, total))
+        if page < pages:
+            links.append('<a href="?page=%d%s">Next &raquo;</a>' % (page + 1, suffix))
+        return '<p>%s</p>\n' % ' | '.join(links)
+
     def do_POST(self):
         """Handle file uploads."""
+        if self.is_upload_api():
+            return self.handle_upload_api()
+
         r, info = self.deal_post_data()
         
         f = io.BytesIO()
@@ -111,6 +1124,8 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         else:
             f.write(b"Failed\n")
             self.send_response(500)
+            # Part of the body may still be unread, so it can't be kept alive
+            self.close_connection = True
             
         length = f.tell()
         f.seek(0)
@@ -122,83 +1137,284 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.copyfile(f, self.wfile)
             f.close()
 
+    def do_PUT(self):
+        """Receive one chunk of a resumable upload."""
+        if self.is_upload_api():
+            return self.handle_upload_api()
+        self.send_error(405, "Method not allowed")
+
+    def do_DELETE(self):
+        """Abort a resumable upload."""
+        if self.is_upload_api():
+            return self.handle_upload_api()
+        self.send_error(405, "Method not allowed")
+
+    def is_upload_api(self):
+        path = urllib.parse.urlsplit(self.path).path
+        return path == UPLOAD_PREFIX or path.startswith(UPLOAD_PREFIX + '/')
+
+    def send_json(self, code, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header("Content-type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_upload_api(self):
+        """Resumable chunked uploads.
+
+        POST   /_upload                  {"name", "size"[, "chunk_size"]} -> session status
+        PUT    /_upload/<id>/<index>     body is chunk <index>
+        GET    /_upload/<id>             session status, incl. received byte ranges
+        POST   /_upload/<id>/finish      atomically move the file into place
+        DELETE /_upload/<id>             abort and remove the temp file
+        """
+        parts = urllib.parse.urlsplit(self.path).path[len(UPLOAD_PREFIX):].strip('/').split('/')
+        if parts == ['']:
+            parts = []
+
+        if self.command == 'POST' and not parts:
+            return self.start_upload()
+
+        if not parts:
+            self.send_error(405, "Method not allowed")
+            return
+        with UPLOADS_LOCK:
+            session = UPLOADS.get(parts[0])
+        if session is None:
+            self.close_connection = True
+            self.send_error(404, "No such upload")
+            return
+
+        if self.command == 'GET' and len(parts) == 1:
+            self.send_json(200, session.status())
+        elif self.command == 'PUT' and len(parts) == 2:
+            self.put_chunk(session, parts[1])
+        elif self.command == 'POST' and parts[1:] == ['finish']:
+            try:
+                error = session.finish()
+            except OSError as e:
+                # The temp file can't be moved into place; the session is over
+                with UPLOADS_LOCK:
+                    UPLOADS.pop(session.id, None)
+                session.abort()
+                error = str(e)
+            if error:
+                self.send_error(409, error)
+                return
+            with UPLOADS_LOCK:
+                UPLOADS.pop(session.id, None)
+            self.send_json(200, {'path': session.name, 'size': session.size})
+        elif self.command == 'DELETE' and len(parts) == 1:
+            with UPLOADS_LOCK:
+                UPLOADS.pop(session.id, None)
+            session.abort()
+            self.send_response(204)
+            self.end_headers()
+        else:
+            self.close_connection = True
+            self.send_error(405, "Method not allowed")
+
+    def start_upload(self):
+        try:
+            length = int(self.headers['content-length'])
+            if length > MAX_FIELD_SIZE:
+                raise ValueError
+            request = json.loads(self.rfile.read(length))
+            name = os.path.basename(str(request['name']).replace('\\', '/'))
+            size = int(request['size'])
+            chunk_size = int(request.get('chunk_size', UPLOAD_CHUNK_SIZE))
+        except (TypeError, ValueError, KeyError):
+            self.close_connection = True
+            self.send_error(400, "Expected JSON with name and size")
+            return
+        if name in ('', '.', '..') or size < 0 or not 0 < chunk_size <= MAX_UPLOAD_CHUNK_SIZE:
+            self.send_error(400, "Invalid name, size or chunk_size")
+            return
+
+        expire_uploads()
+        try:
+            session = UploadSession(name, size, chunk_size, os.getcwd())
+        except ValueError:
+            # e.g. a NUL byte in the name, which os.open rejects
+            self.send_error(400, "Invalid name, size or chunk_size")
+            return
+        except OSError:
+            self.send_error(500, "Can't create file to write, do you have permission to write?")
+            return
+        with UPLOADS_LOCK:
+            UPLOADS[session.id] = session
+        self.send_json(201, session.status())
+
+    def put_chunk(self, session, index):
+        try:
+            index = int(index)
+            length = int(self.headers['content-length'])
+        except (TypeError, ValueError):
+            index = length = -1
+        if not 0 <= index < session.chunks or length != session.chunk_length(index):
+            self.close_connection = True
+            self.send_error(400, "Bad chunk index or length")
+            return
+        try:
+            session.write_chunk(index, self.rfile, length)
+        except KeyError:
+            self.close_connection = True
+            self.send_error(404, "No such upload")
+            return
+        except (OSError, ValueError) as e:
+            self.close_connection = True
+            self.send_error(500, str(e))
+            return
+        self.send_response(204)
+        self.end_headers()
+
     def deal_post_data(self):
-        """Process the POST request to save the file."""
-        content_type = self.headers['content-type']
-        if not content_type:
+        """Process the POST request and save every uploaded file in it."""
+        ctype, params = parse_header(self.headers.get('content-type', ''))
+        if ctype != 'multipart/form-data' or 'boundary' not in params:
             return (False, "Content-Type header doesn't contain boundary")
-        
-        boundary = content_type.split("=")[1].encode()
-        remainbytes = int(self.headers['content-length'])
-        line = self.rfile.readline()
-        remainbytes -= len(line)
-        if not boundary in line:
-            return (False, "Content NOT begin with boundary")
-        
-        line = self.rfile.readline()
-        remainbytes -= len(line)
-        fn = None
-        
-        # Parse headers to find filename
-        while len(line) > 0 and line.strip():
-            decoded_line = line.decode()
-            if "Content-Disposition" in decoded_line:
-                if "filename=" in decoded_line:
-                    fn = decoded_line.split('filename=')[1]
-                    if fn[0] == '"' or fn[0] == "'வுகளை:":
-                        fn = fn[1:-1] # Strip quotes
-                    fn = fn.strip()
-            line = self.rfile.readline()
-            remainbytes -= len(line)
-
-        if not fn:
-            return (False, "Can't find out file name...")
-        
-        # Sanitize filename
-        fn = os.path.basename(fn)
-        fn = os.path.join(os.getcwd(), fn)
-        
         try:
-            out = open(fn, 'wb')
-        except IOError:
-            return (False, "Can't create file to write, do you have permission to write?")
-            
-        # Read the file data
-        # Note: The original simple approach might be buggy with binary data if not careful
-        # We need to read until the boundary
-        
-        # A simple way to handle this without complex multipart parsing library is reading line by line
-        # but that is slow for binary.
-        # However, for a "Tiny Tool", we can try a slightly robust read loop.
-        
-        preline = self.rfile.readline()
-        remainbytes -= len(preline)
-        while remainbytes > 0:
-            line = self.rfile.readline()
-            remainbytes -= len(line)
-            if boundary in line:
-                preline = preline[0:-1]
-                if preline.endswith(b'\r'):
-                    preline = preline[0:-1]
-                out.write(preline)
+            remainbytes = int(self.headers['content-length'])
+        except (TypeError, ValueError):
+            return (False, "Missing or invalid Content-Length")
+
+        reader = MultipartReader(self.rfile, params['boundary'].encode(), remainbytes)
+        self.form_fields = {}
+        saved = []
+        out = None
+        try:
+            for headers in reader:
+                disposition, dparams = parse_header(headers.get('content-disposition', ''))
+                fn = dparams.get('filename')
+                if disposition != 'form-data' or fn is None:
+                    # Plain form field: keep it, but never more than MAX_FIELD_SIZE
+                    value = reader.read_field(MAX_FIELD_SIZE)
+                    if 'name' in dparams:
+                        self.form_fields[dparams['name']] = value
+                    continue
+
+                # Sanitize filename (browsers on Windows may send full paths)
+                fn = os.path.basename(fn.replace('\\', '/'))
+                if not fn:
+                    reader.skip_part()
+                    continue
+                fn = os.path.join(os.getcwd(), fn)
+                try:
+                    out = open(fn, 'wb')
+                except IOError:
+                    return (False, "Can't create file to write, do you have permission to write?")
+                reader.copy_part(out)
                 out.close()
-                return (True, "File '%s' upload success!" % fn)
-            else:
-                out.write(preline)
-                preline = line
-                
-        return (False, "Unexpect Ends of data.")
+                out = None
+                saved.append(fn)
+        except ValueError as e:
+            if out is not None:
+                out.close()
+                os.remove(out.name)
+            return (False, str(e))
+
+        if not saved:
+            return (False, "Can't find out file name...")
+        if not reader.drain(MAX_FIELD_SIZE):
+            self.close_connection = True
+        return (True, "File(s) %s upload success!" % ", ".join("'%s'" % fn for fn in saved))
 
     def get_upload_form_html(self):
+        # Without JavaScript the form is a plain multipart POST; with it, files
+        # (picked or dropped on the box) go through the resumable chunk API
         return """
-        <div style="background: #f0f0f0; padding: 15px; border-radius: 5px; margin-bottom: 20px; border: 1px dashed #999;">
+        <div id="dropzone" style="background: #f0f0f0; padding: 15px; border-radius: 5px; margin-bottom: 20px; border: 1px dashed #999;">
             <h3>Upload File</h3>
-            <form ENCTYPE="multipart/form-data" method="post">
-                <input name="file" type="file"/>
+            <form id="upload-form" ENCTYPE="multipart/form-data" method="post">
+                <input name="file" type="file" multiple/>
                 <input type="submit" value="Upload"/>
             </form>
+            <p id="upload-status"></p>
             <p style="font-size: small; color: #666;">Or use curl: <code>curl -F "file=@filename" http://host:port/</code></p>
         </div>
+        <script>
+        (function () {
+            var PARALLEL = 4, RETRIES = 3;
+            var form = document.getElementById('upload-form');
+            var zone = document.getElementById('dropzone');
+            var status = document.getElementById('upload-status');
+            if (!window.fetch || !window.Blob || !Blob.prototype.slice) return;
+
+            async function api(method, url, body) {
+                var r = await fetch(url, {method: method, body: body});
+                if (!r.ok) throw new Error(method + ' ' + url + ': ' + r.status);
+                return r.status === 204 ? null : r.json();
+            }
+
+            async function session(file) {
+                var key = 'share-upload:' + file.name + ':' + file.size + ':' + file.lastModified;
+                var id = localStorage.getItem(key);
+                var s = null;
+                if (id) {
+                    try { s = await api('GET', '/_upload/' + id); } catch (e) { s = null; }
+                }
+                if (!s) {
+                    s = await api('POST', '/_upload', JSON.stringify({name: file.name, size: file.size}));
+                    localStorage.setItem(key, s.id);
+                }
+                s.key = key;
+                return s;
+            }
+
+            async function upload(file) {
+                var s = await session(file), size = s.chunk_size, have = {}, todo = [];
+                s.received.forEach(function (r) {
+                    for (var i = r[0] / size; i < Math.ceil(r[1] / size); i++) have[i] = true;
+                });
+                if (file.size === 0 && s.complete) have[0] = true;
+                for (var i = 0; i < s.chunks; i++) if (!have[i]) todo.push(i);
+                var done = s.chunks - todo.length;
+
+                async function worker() {
+                    while (todo.length) {
+                        var i = todo.shift();
+                        for (var attempt = 1; ; attempt++) {
+                            try {
+                                await api('PUT', '/_upload/' + s.id + '/' + i, file.slice(i * size, (i + 1) * size));
+                                break;
+                            } catch (e) {
+                                if (attempt >= RETRIES) throw e;
+                            }
+                        }
+                        done++;
+                        status.textContent = file.name + ': ' + Math.floor(done * 100 / s.chunks) + '%';
+                    }
+                }
+                var workers = [];
+                for (var w = 0; w < PARALLEL; w++) workers.push(worker());
+                await Promise.all(workers);
+                await api('POST', '/_upload/' + s.id + '/finish');
+                localStorage.removeItem(s.key);
+            }
+
+            async function uploadAll(files) {
+                try {
+                    for (var i = 0; i < files.length; i++) await upload(files[i]);
+                    status.textContent = 'Success';
+                    location.reload();
+                } catch (e) {
+                    status.textContent = 'Upload failed: ' + e.message + ' (upload the same file again to resume)';
+                }
+            }
+
+            form.addEventListener('submit', function (e) {
+                e.preventDefault();
+                uploadAll(form.elements.file.files);
+            });
+            zone.addEventListener('dragover', function (e) { e.preventDefault(); });
+            zone.addEventListener('drop', function (e) {
+                e.preventDefault();
+                uploadAll(e.dataTransfer.files);
+            });
+        })();
+        </script>
         """
         
     def get_upload_page(self):
@@ -214,23 +1430,296 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         """ % self.get_upload_form_html()
 
 
-def run(server_class=http.server.HTTPServer, handler_class=CustomHTTPRequestHandler):
-    server_address = ('', PORT)
-    httpd = server_class(server_address, handler_class)
-    
-    # Get local IP
+def reject_connection(sock):
+    """Answer 503 and hang up on a connection we have no room for.
+
+    Runs on the accept thread, so it must never block: the response fits in
+    the empty send buffer of a new socket, and if it somehow doesn't the
+    client just sees the connection close.
+    """
+    try:
+        sock.setblocking(False)
+        sock.send(BUSY_RESPONSE)
+    except OSError:
+        pass
+    finally:
+        sock.close()
+
+
+class WorkerPool:
+    """A fixed set of daemon worker threads fed from a queue.
+
+    ThreadPoolExecutor joins its threads at interpreter exit, so one slow
+    upload would keep the process alive after Ctrl+C; daemon workers don't.
+    """
+
+    def __init__(self, workers, name='share'):
+        self.tasks = queue.SimpleQueue()
+        self.threads = [threading.Thread(target=self._work, name=f'{name}-{i}', daemon=True)
+                        for i in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.tasks.put((future, fn, args))
+        return future
+
+    def _work(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+            future, fn, args = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def shutdown(self):
+        """Let idle workers exit; busy ones are daemons and die with the process."""
+        for _ in self.threads:
+            self.tasks.put(None)
+
+
+class PooledHTTPServer(http.server.HTTPServer):
+    """HTTPServer that serves connections on a bounded thread pool.
+
+    Every open connection either has a worker or waits in the pool queue, so
+    the queue holds up to `max_connections - workers` of them; beyond
+    `max_connections` new ones get a 503. `queue_depth` is only the listen()
+    backlog here.
+    """
+
+    def __init__(self, server_address, handler_class, workers=WORKERS,
+                 max_connections=MAX_CONNECTIONS, queue_depth=QUEUE_DEPTH):
+        # Also used as the listen() backlog
+        self.request_queue_size = queue_depth
+        self.workers = workers
+        self.max_connections = max_connections
+        self.queue_depth = queue_depth
+        self.lock = threading.Lock()
+        self.connections = 0
+        # Before binding: a failed bind calls server_close(), which stops the pool
+        self.pool = WorkerPool(workers)
+        super().__init__(server_address, handler_class)
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            busy = self.connections >= self.max_connections
+            if not busy:
+                self.connections += 1
+        if busy:
+            reject_connection(request)
+            return
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self.lock:
+                self.connections -= 1
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown()
+
+
+class AsyncHTTPServer:
+    """asyncio front end for the same request handler.
+
+    The event loop owns accepting and waiting on keep-alive connections, so an
+    idle client costs a coroutine instead of a thread. Once a request arrives
+    it is handed to a bounded worker pool, which runs the regular blocking
+    handler for exactly one request and gives the connection back.
+    """
+
+    def __init__(self, server_address, handler_class, workers=WORKERS,
+                 max_connections=MAX_CONNECTIONS, queue_depth=QUEUE_DEPTH, timeout=TIMEOUT):
+        self.server_address = server_address
+        self.socket = socket.create_server(server_address, backlog=queue_depth)
+        self.socket.setblocking(False)
+        self.handler_class = self._make_handler_class(handler_class)
+        self.workers = workers
+        self.max_connections = max_connections
+        self.queue_depth = queue_depth
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.waiting = 0
+
+    @staticmethod
+    def _make_handler_class(base):
+        class AsyncRequestHandler(base):
+            # Keep-alive is what makes the event loop worth it
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without this, Nagle
+            # plus delayed ACKs stall every reused connection by ~40 ms
+            disable_nagle_algorithm = True
+
+            def handle(self):
+                # Requests are driven one at a time by the server
+                pass
+
+            def finish(self):
+                pass
+
+            def close(self):
+                super().finish()
+
+        AsyncRequestHandler.__name__ = base.__name__
+        return AsyncRequestHandler
+
+    def serve_forever(self):
+        asyncio.run(self._serve())
+
+    def server_close(self):
+        self.socket.close()
+
+    def handle_error(self, request, client_address):
+        print('-' * 40, file=sys.stderr)
+        print('Exception occurred during processing of request from', client_address, file=sys.stderr)
+        traceback.print_exc()
+        print('-' * 40, file=sys.stderr)
+
+    async def _serve(self):
+        loop = asyncio.get_running_loop()
+        self.pool = WorkerPool(self.workers)
+        tasks = set()
+        try:
+            while True:
+                conn, addr = await loop.sock_accept(self.socket)
+                if self.connections >= self.max_connections:
+                    # Answered in its own task so a slow client can't stall accepting
+                    task = loop.create_task(self._send_busy(conn, close=True))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    continue
+                self.connections += 1
+                task = loop.create_task(self._serve_connection(conn, addr))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            self.pool.shutdown()
+
+    async def _send_busy(self, conn, close=False):
+        """Answer 503 without blocking the event loop on a slow client."""
+        loop = asyncio.get_running_loop()
+        try:
+            conn.setblocking(False)
+            await asyncio.wait_for(loop.sock_sendall(conn, BUSY_RESPONSE), 1)
+        except (OSError, asyncio.TimeoutError):
+            pass
+        finally:
+            if close:
+                conn.close()
+
+    def _wait_readable(self, sock):
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        fd = sock.fileno()
+        loop.add_reader(fd, lambda: fut.done() or fut.set_result(None))
+        fut.add_done_callback(lambda _: loop.remove_reader(fd))
+        return fut
+
+    def _has_buffered_request(self, handler):
+        """True if a pipelined request already sits in the handler's read buffer."""
+        sock = handler.connection
+        sock.setblocking(False)
+        try:
+            return bool(handler.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            sock.settimeout(self.timeout)
+
+    def _handle_one_request(self, handler):
+        with self.lock:
+            self.waiting -= 1
+        handler.close_connection = True
+        try:
+            handler.handle_one_request()
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+            return True
+        return handler.close_connection
+
+    async def _serve_connection(self, conn, addr):
+        loop = asyncio.get_running_loop()
+        handler = None
+        try:
+            conn.settimeout(self.timeout)
+            handler = self.handler_class(conn, addr, self)
+            while True:
+                if not self._has_buffered_request(handler):
+                    await asyncio.wait_for(self._wait_readable(conn), self.timeout)
+                with self.lock:
+                    if self.waiting >= self.queue_depth:
+                        busy = True
+                    else:
+                        busy = False
+                        self.waiting += 1
+                if busy:
+                    await self._send_busy(conn)
+                    break
+                if await asyncio.wrap_future(self.pool.submit(self._handle_one_request, handler)):
+                    break
+        except (asyncio.TimeoutError, OSError):
+            pass
+        except asyncio.CancelledError:
+            # The server is stopping; a worker may still be blocked reading this
+            # socket, holding rfile's lock, so wake it before closing anything
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            raise
+        finally:
+            if handler is not None:
+                try:
+                    handler.close()
+                except OSError:
+                    pass
+            conn.close()
+            self.connections -= 1
+
+
+def get_local_ip():
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
         # doesn't even have to be reachable
         s.connect(('10.255.255.255', 1))
-        IP = s.getsockname()[0]
+        return s.getsockname()[0]
     except Exception:
-        IP = '127.0.0.1'
+        return '127.0.0.1'
     finally:
         s.close()
 
-    print(f"[-] Share.py is running.")
-    print(f"[-] Serving at http://{IP}:{PORT}")
+
+def run(port=PORT, mode='threaded', handler_class=CustomHTTPRequestHandler, workers=WORKERS,
+        max_connections=MAX_CONNECTIONS, queue_depth=QUEUE_DEPTH, timeout=TIMEOUT):
+    server_address = ('', port)
+    if mode == 'single':
+        httpd = http.server.HTTPServer(server_address, handler_class)
+    elif mode == 'threaded':
+        # A stuck client must not pin a worker forever
+        handler_class = type(handler_class.__name__, (handler_class,), {'timeout': timeout})
+        httpd = PooledHTTPServer(server_address, handler_class, workers, max_connections, queue_depth)
+    elif mode == 'asyncio':
+        httpd = AsyncHTTPServer(server_address, handler_class, workers, max_connections, queue_depth, timeout)
+    else:
+        raise ValueError(f"Unknown mode: {mode}")
+
+    IP = get_local_ip()
+
+    print(f"[-] Share.py is running ({mode} mode).")
+    print(f"[-] Serving at http://{IP}:{port}")
     print(f"[-] Uploads are saved to: {os.getcwd()}")
     print(f"[-] Ctrl+C to stop")
     
@@ -238,8 +1727,27 @@ def run(server_class=http.server.HTTPServer, handler_class=CustomHTTPRequestHand
         httpd.serve_forever()
     except KeyboardInterrupt:
         print("\nStopping server...")
-        httpd.socket.close()
+        httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LAN dropzone: serve the current directory and accept uploads.")
+    parser.add_argument("port", nargs="?", type=int, default=PORT, help=f"Port to listen on (default: {PORT})")
+    parser.add_argument("--mode", choices=["single", "threaded", "asyncio"], default="threaded",
+                        help="Concurrency mode (default: threaded)")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help=f"Worker threads handling requests (default: {WORKERS})")
+    parser.add_argument("--max-connections", type=int, default=MAX_CONNECTIONS,
+                        help=f"Open connections before new ones get a 503 (default: {MAX_CONNECTIONS})")
+    parser.add_argument("--queue-depth", type=int, default=QUEUE_DEPTH,
+                        help=f"asyncio mode: requests waiting for a worker before new ones get a 503; "
+                             f"in threaded mode connections wait up to --max-connections (default: {QUEUE_DEPTH})")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT,
+                        help=f"Seconds a connection may sit idle (default: {TIMEOUT})")
+
+    args = parser.parse_args()
+    run(args.port, args.mode, workers=args.workers, max_connections=args.max_connections,
+        queue_depth=args.queue_depth, timeout=args.timeout)
 
 if __name__ == '__main__':
-    import socket
-    run()
+    main()